@@ -4,15 +4,19 @@ SnackScan Backend API
 A Flask API for vending machine image recognition and nutrition data
 """
 
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory
 from flask_cors import CORS
+from streaming_form_data import StreamingFormDataParser
+from streaming_form_data.parser import ParseFailedException
+from streaming_form_data.targets import ValueTarget
 import os
 import logging
 from datetime import datetime
+from operator import itemgetter
 
 # Import our services
-from services.image_recognition import analyze_image
-from services.nutrition_api import get_nutrition_data
+from services.image_recognition import analyze_image, COMPREHENSIVE_VENDING_PRODUCTS
+from services.nutrition_api import get_nutrition_data, record_scan
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -23,12 +27,11 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Configuration
-UPLOAD_FOLDER = 'uploads'
 MAX_FILE_SIZE = 16 * 1024 * 1024  # 16MB max file size
+UPLOAD_CHUNK_SIZE = 64 * 1024  # Bytes read from the request stream per iteration
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
-
-# Ensure upload directory exists
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+SCAN_SESSION_HEADER = 'X-Scan-Session'  # Per-tab session id sent by the frontend
+MAX_SCAN_SESSION_LENGTH = 64
 
 def allowed_file(filename):
     """Check if uploaded file has allowed extension"""
@@ -53,32 +56,45 @@ def analyze_vending_image():
         JSON response with detected products
     """
     try:
+        if request.content_length and request.content_length > MAX_FILE_SIZE:
+            return too_large(None)
+        
+        # Only multipart uploads can carry an image file
+        if request.mimetype != 'multipart/form-data':
+            return jsonify({'error': 'No image file provided'}), 400
+        
+        # Stream the multipart body into memory chunk by chunk; the image is
+        # analyzed straight from these bytes and never touches the disk
+        target = ValueTarget()
+        try:
+            parser = StreamingFormDataParser(headers=request.headers)
+            parser.register('image', target)
+            
+            received = 0
+            while chunk := request.stream.read(UPLOAD_CHUNK_SIZE):
+                received += len(chunk)
+                if received > MAX_FILE_SIZE:
+                    return too_large(None)
+                parser.data_received(chunk)
+        except ParseFailedException:
+            # Malformed multipart body, e.g. a missing or wrong boundary
+            return jsonify({'error': 'No image file provided'}), 400
+        
         # Check if image file was uploaded
-        if 'image' not in request.files:
+        if target.multipart_filename is None:
             return jsonify({'error': 'No image file provided'}), 400
         
-        file = request.files['image']
-        if file.filename == '':
+        original_filename = os.path.basename(target.multipart_filename)
+        if original_filename == '':
             return jsonify({'error': 'No file selected'}), 400
         
-        if not allowed_file(file.filename):
+        if not allowed_file(original_filename):
             return jsonify({'error': 'File type not allowed'}), 400
         
-        # Save uploaded file temporarily
-        filename = f"temp_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{file.filename}"
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
-        file.save(filepath)
-        
-        logger.info(f"Processing image: {filename}")
+        logger.info(f"Processing image: {original_filename}")
         
         # Analyze image for products
-        products = analyze_image(filepath)
-        
-        # Clean up temporary file
-        try:
-            os.remove(filepath)
-        except OSError:
-            logger.warning(f"Could not remove temporary file: {filepath}")
+        products = analyze_image(target.value, original_filename)
         
         logger.info(f"Found {len(products)} products in image")
         
@@ -124,6 +140,12 @@ def get_product_nutrition(product_name):
         
         logger.info(f"Found nutrition data for: {product_name}")
         
+        # Learn scan order and prefetch the products likely to be scanned next;
+        # without a session id, lookups from different users can't be told apart
+        scan_session = request.headers.get(SCAN_SESSION_HEADER, '').strip()
+        if scan_session and len(scan_session) <= MAX_SCAN_SESSION_LENGTH:
+            record_scan(scan_session, product_name)
+        
         return jsonify({
             'success': True,
             'nutrition': nutrition_data
@@ -137,6 +159,29 @@ def get_product_nutrition(product_name):
             'details': str(e)
         }), 500
 
+def _build_products_json():
+    """Serialize the product catalog response body"""
+    products = []
+    for product in COMPREHENSIVE_VENDING_PRODUCTS:
+        products.append({
+            'name': product['official'],
+            'category': product['category'],
+            'popularity': product['popularity'],
+            'description': product.get('description', '')
+        })
+    
+    # Sort by popularity
+    products.sort(key=itemgetter('popularity'), reverse=True)
+    
+    return app.json.dumps({
+        'success': True,
+        'products': products,
+        'count': len(products)
+    }, separators=(',', ':'))
+
+# The catalog never changes at runtime, so the response body is built once
+_PRODUCTS_JSON = _build_products_json()
+
 @app.route('/api/products', methods=['GET'])
 def get_available_products():
     """
@@ -145,35 +190,11 @@ def get_available_products():
     Returns:
         JSON response with product list
     """
-    try:
-        # Import the product database
-        from services.image_recognition import COMPREHENSIVE_VENDING_PRODUCTS
-        
-        products = []
-        for product in COMPREHENSIVE_VENDING_PRODUCTS:
-            products.append({
-                'name': product['official'],
-                'category': product['category'],
-                'popularity': product['popularity'],
-                'description': product.get('description', '')
-            })
-        
-        # Sort by popularity
-        products.sort(key=lambda x: x['popularity'], reverse=True)
-        
-        return jsonify({
-            'success': True,
-            'products': products,
-            'count': len(products)
-        })
-        
-    except Exception as e:
-        logger.error(f"Error getting products: {str(e)}")
-        return jsonify({
-            'success': False,
-            'error': 'Failed to get products',
-            'details': str(e)
-        }), 500
+    return Response(
+        _PRODUCTS_JSON,
+        mimetype='application/json',
+        headers={'Cache-Control': 'public, max-age=3600'}
+    )
 
 @app.errorhandler(413)
 def too_large(e):
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+SnackScan Backend Gunicorn Configuration
+Production server settings, used with: gunicorn -c gunicorn.conf.py app:app
+"""
+
+import gc
+import multiprocessing
+import os
+
+from dotenv import load_dotenv
+
+# Load .env the same way run.py does, so API keys and these settings apply
+load_dotenv()
+
+# Bind to the same host/port as the development server
+bind = f"{os.getenv('FLASK_HOST', '127.0.0.1')}:{os.getenv('FLASK_PORT', 5000)}"
+
+# One worker process per core so CPU-bound image analysis runs in parallel,
+# with a few threads each to overlap I/O-bound nutrition API lookups
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 2))
+
+# Vision API calls and nutrition fallbacks can take several seconds
+timeout = 60
+
+# Import the app once in the master so the product catalog, mock nutrition
+# table and search indexes are built a single time and shared copy-on-write
+preload_app = True
+
+def pre_fork(server, worker):
+    """Move preloaded objects out of the garbage collector's view before forking"""
+    # Collections in a worker would otherwise touch, and so copy, the shared pages
+    gc.freeze()
@@ -4,13 +4,20 @@ Image Recognition Service for SnackScan
 Analyzes vending machine images to detect products
 """
 
+import hashlib
+import heapq
+import io
 import os
 import logging
 import random
+import secrets
 import time
-from typing import List, Dict, Any, Optional
+from functools import lru_cache
+from operator import itemgetter
+from typing import List, Dict, Any, Optional, Tuple, Set, FrozenSet
 from PIL import Image
 import numpy as np
+import cv2
 
 # Optional Google Vision API
 try:
@@ -20,6 +27,20 @@ except ImportError:
     VISION_AVAILABLE = False
     logging.warning("Google Vision API not available. Using mock recognition.")
 
+# Optional on-disk cache for Google Vision results
+try:
+    import diskcache
+    DISKCACHE_AVAILABLE = True
+except ImportError:
+    DISKCACHE_AVAILABLE = False
+
+# Optional Aho-Corasick automaton for single-pass multi-pattern text search
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
 # Comprehensive vending machine product database
@@ -191,71 +212,157 @@ COMPREHENSIVE_VENDING_PRODUCTS = [
     }
 ]
 
-def analyze_image(image_path: str) -> List[Dict[str, Any]]:
+# Lowercased name words with their trigrams, built once for text matching
+_PRODUCT_NAME_INDEX = [
+    (product, [
+        [(word, tuple(word[i:i+3] for i in range(len(word) - 2))) for word in name.lower().split()]
+        for name in product['names']
+    ])
+    for product in COMPREHENSIVE_VENDING_PRODUCTS
+]
+
+# Every distinct name word and trigram that text matching looks for
+_NAME_PATTERNS = frozenset(
+    pattern
+    for _, name_words in _PRODUCT_NAME_INDEX
+    for words in name_words
+    for word, trigrams in words
+    for pattern in (word, *trigrams)
+)
+
+def _build_automaton(patterns) -> Optional[Any]:
+    """Build an Aho-Corasick automaton over patterns, or None if unavailable"""
+    if not AHOCORASICK_AVAILABLE:
+        return None
+    
+    automaton = ahocorasick.Automaton()
+    for pattern in patterns:
+        automaton.add_word(pattern, pattern)
+    automaton.make_automaton()
+    return automaton
+
+_NAME_AUTOMATON = _build_automaton(_NAME_PATTERNS)
+
+def _find_patterns(text: str, patterns: FrozenSet[str], automaton: Optional[Any]) -> Set[str]:
+    """Return the patterns that occur as substrings of text"""
+    if automaton is not None:
+        return {pattern for _, pattern in automaton.iter(text)}
+    
+    # Whole-word hits come from a single hash-set intersection; only the
+    # remaining patterns need a substring scan of the text
+    tokens = frozenset(text.split())
+    found = set(patterns & tokens)
+    found.update(pattern for pattern in patterns if pattern not in found and pattern in text)
+    return found
+
+# Product aliases with spaces and dashes removed, matched against upload filenames
+_FILENAME_ALIASES = [
+    (name.replace(' ', '').replace('-', '').lower(), product)
+    for product in COMPREHENSIVE_VENDING_PRODUCTS
+    for name in product['names']
+]
+_FILENAME_ALIAS_PATTERNS = frozenset(alias for alias, _ in _FILENAME_ALIASES)
+_FILENAME_AUTOMATON = _build_automaton(_FILENAME_ALIAS_PATTERNS)
+
+def analyze_image(image_bytes: bytes, filename: str = '') -> List[Dict[str, Any]]:
     """
     Analyze vending machine image for products
     
     Args:
-        image_path: Path to the image file
+        image_bytes: Raw contents of the uploaded image
+        filename: Original filename of the upload, used as a recognition hint
         
     Returns:
         List of detected products with confidence scores
     """
-    logger.info(f"Analyzing vending machine image: {image_path}")
+    logger.info(f"Analyzing vending machine image: {filename} ({len(image_bytes)} bytes)")
     
     try:
         # Check if Google Vision API is available and configured
         if VISION_AVAILABLE and os.getenv('GOOGLE_APPLICATION_CREDENTIALS'):
             logger.info("Using Google Vision API for image analysis")
-            return _analyze_with_google_vision(image_path)
+            return _analyze_with_google_vision(image_bytes, filename)
         else:
             logger.info("Using intelligent mock recognition")
-            return _intelligent_mock_recognition(image_path)
+            return _intelligent_mock_recognition(image_bytes, filename)
             
     except Exception as e:
         logger.error(f"Error analyzing image: {e}")
-        return _intelligent_mock_recognition(image_path)
+        return _intelligent_mock_recognition(image_bytes, filename)
+
+# Google Vision client and result cache, created on first use and shared across requests
+_VISION_CLIENT = None
+_VISION_CACHE = None
+_VISION_CACHE_DISABLED = False
+VISION_CACHE_EXPIRE = 7 * 24 * 60 * 60  # Keep cached Vision results for a week
+
+def _get_vision_client() -> Any:
+    """Return the shared Google Vision client, creating it on first use"""
+    global _VISION_CLIENT
+    if _VISION_CLIENT is None:
+        _VISION_CLIENT = vision.ImageAnnotatorClient()
+    return _VISION_CLIENT
 
-def _analyze_with_google_vision(image_path: str) -> List[Dict[str, Any]]:
+def _get_vision_cache() -> Optional[Any]:
+    """Return the shared on-disk Vision result cache, or None if unavailable"""
+    global _VISION_CACHE
+    if _VISION_CACHE is None and DISKCACHE_AVAILABLE and not _VISION_CACHE_DISABLED:
+        try:
+            _VISION_CACHE = diskcache.Cache(os.getenv('VISION_CACHE_DIR', 'cache/vision'))
+        except Exception as e:
+            _disable_vision_cache(e)
+    return _VISION_CACHE
+
+def _disable_vision_cache(error: Exception) -> None:
+    """Stop using the Vision result cache after an error, logging it once"""
+    global _VISION_CACHE, _VISION_CACHE_DISABLED
+    if not _VISION_CACHE_DISABLED:
+        logger.warning(f"Vision result cache disabled: {error}")
+    _VISION_CACHE_DISABLED = True
+    _VISION_CACHE = None
+
+def _read_vision_cache(cache_key: str) -> Optional[str]:
+    """Return cached Vision text for an image, or None on a miss or cache error"""
+    cache = _get_vision_cache()
+    if cache is None:
+        return None
+    try:
+        return cache.get(cache_key)
+    except Exception as e:
+        _disable_vision_cache(e)
+        return None
+
+def _write_vision_cache(cache_key: str, text: str) -> None:
+    """Store Vision text for an image, ignoring cache errors"""
+    cache = _get_vision_cache()
+    if cache is None:
+        return
+    try:
+        cache.set(cache_key, text, expire=VISION_CACHE_EXPIRE)
+    except Exception as e:
+        _disable_vision_cache(e)
+
+def _analyze_with_google_vision(image_bytes: bytes, filename: str) -> List[Dict[str, Any]]:
     """
     Analyze image using Google Vision API
     
     Args:
-        image_path: Path to the image file
+        image_bytes: Raw contents of the image
+        filename: Original filename of the upload
         
     Returns:
         List of detected products
     """
     try:
-        client = vision.ImageAnnotatorClient()
+        # Identical uploads reuse the text detected for them earlier
+        cache_key = hashlib.blake2b(image_bytes, digest_size=16).hexdigest()
+        combined_text = _read_vision_cache(cache_key)
         
-        # Load image
-        with open(image_path, 'rb') as image_file:
-            content = image_file.read()
-        
-        image = vision.Image(content=content)
-        
-        # Perform text detection
-        text_response = client.text_detection(image=image)
-        texts = text_response.text_annotations
-        
-        # Perform logo detection
-        logo_response = client.logo_detection(image=image)
-        logos = logo_response.logo_annotations
-        
-        # Perform object detection
-        object_response = client.object_localization(image=image)
-        objects = object_response.localized_object_annotations
-        
-        # Combine all detected text
-        detected_text = []
-        if texts:
-            detected_text.extend([text.description.lower() for text in texts])
-        if logos:
-            detected_text.extend([logo.description.lower() for logo in logos])
-        
-        combined_text = ' '.join(detected_text)
-        logger.info(f"Detected text from vision API: {combined_text[:100]}...")
+        if combined_text is not None:
+            logger.info("Using cached Vision API result")
+        else:
+            combined_text = _detect_text_with_google_vision(image_bytes)
+            _write_vision_cache(cache_key, combined_text)
         
         # Match against product database
         products = _match_products_from_text(combined_text)
@@ -265,7 +372,45 @@ def _analyze_with_google_vision(image_path: str) -> List[Dict[str, Any]]:
         
     except Exception as e:
         logger.error(f"Google Vision API error: {e}")
-        return _intelligent_mock_recognition(image_path)
+        return _intelligent_mock_recognition(image_bytes, filename)
+
+def _detect_text_with_google_vision(image_bytes: bytes) -> str:
+    """
+    Detect text and logos in an image with Google Vision API
+    
+    Args:
+        image_bytes: Raw contents of the image
+        
+    Returns:
+        Lowercased detected text and logo descriptions, space separated
+    """
+    client = _get_vision_client()
+    
+    image = vision.Image(content=image_bytes)
+    
+    # Perform text, logo and object detection in a single round-trip
+    response = client.annotate_image({
+        'image': image,
+        'features': [
+            {'type_': vision.Feature.Type.TEXT_DETECTION},
+            {'type_': vision.Feature.Type.LOGO_DETECTION},
+            {'type_': vision.Feature.Type.OBJECT_LOCALIZATION}
+        ]
+    })
+    texts = response.text_annotations
+    logos = response.logo_annotations
+    objects = response.localized_object_annotations
+    
+    # Combine all detected text
+    detected_text = []
+    if texts:
+        detected_text.extend([text.description.lower() for text in texts])
+    if logos:
+        detected_text.extend([logo.description.lower() for logo in logos])
+    
+    combined_text = ' '.join(detected_text)
+    logger.info(f"Detected text from vision API: {combined_text[:100]}...")
+    return combined_text
 
 def _match_products_from_text(detected_text: str) -> List[Dict[str, Any]]:
     """
@@ -277,61 +422,74 @@ def _match_products_from_text(detected_text: str) -> List[Dict[str, Any]]:
     Returns:
         List of matched products
     """
+    return [
+        {
+            'id': _generate_id(),
+            'name': product['official'],
+            'confidence': confidence,
+            'category': product['category'],
+            'description': product.get('description', ''),
+            'popularity': product['popularity']
+        }
+        for product, confidence in _rank_products_from_text(detected_text)
+    ]
+
+@lru_cache(maxsize=1024)
+def _rank_products_from_text(detected_text: str) -> Tuple[Tuple[Dict[str, Any], float], ...]:
+    """
+    Rank catalog products against detected text, memoized per text
+    
+    Args:
+        detected_text: Combined text from image recognition
+        
+    Returns:
+        Top 8 (product, confidence) pairs ordered by confidence * popularity
+    """
     detected_products = {}
     
-    for product in COMPREHENSIVE_VENDING_PRODUCTS:
-        confidence = _calculate_match_confidence(product, detected_text)
+    # One pass over the text finds every name word and trigram it contains
+    found_patterns = _find_patterns(detected_text, _NAME_PATTERNS, _NAME_AUTOMATON)
+    
+    for product, name_words in _PRODUCT_NAME_INDEX:
+        confidence = _calculate_match_confidence(name_words, found_patterns)
         
         if confidence > 0.25:  # Minimum confidence threshold
             key = product['official']
             
             # Apply popularity boost
-            final_confidence = min(0.95, confidence + (product['popularity'] / 100 * 0.1))
+            final_confidence = round(min(0.95, confidence + (product['popularity'] / 100 * 0.1)), 2)
             
-            if key not in detected_products or detected_products[key]['confidence'] < final_confidence:
-                detected_products[key] = {
-                    'id': _generate_id(),
-                    'name': product['official'],
-                    'confidence': round(final_confidence, 2),
-                    'category': product['category'],
-                    'description': product.get('description', ''),
-                    'popularity': product['popularity']
-                }
-    
-    # Sort by confidence * popularity and return top 8
-    results = list(detected_products.values())
-    results.sort(key=lambda x: x['confidence'] * x['popularity'], reverse=True)
+            if key not in detected_products or detected_products[key][2] < final_confidence:
+                # Store the ranking score up front so sorting needs no per-item callback
+                detected_products[key] = (final_confidence * product['popularity'], product, final_confidence)
     
-    return results[:8]
+    # Return top 8 by confidence * popularity
+    top_matches = heapq.nlargest(8, detected_products.values(), key=itemgetter(0))
+    return tuple((product, confidence) for _, product, confidence in top_matches)
 
-def _calculate_match_confidence(product: Dict[str, Any], detected_text: str) -> float:
+def _calculate_match_confidence(name_words: List[List[Tuple[str, Tuple[str, ...]]]], found_patterns: Set[str]) -> float:
     """
     Calculate confidence score for product match
     
     Args:
-        product: Product dictionary
-        detected_text: Text detected in image
+        name_words: Precomputed (word, trigrams) pairs for each product name
+        found_patterns: Name words and trigrams present in the detected text
         
     Returns:
         Confidence score between 0 and 1
     """
     max_confidence = 0.0
     
-    for name in product['names']:
-        words = name.lower().split()
+    for words in name_words:
         match_count = 0
         partial_matches = 0
         
-        for word in words:
-            if word in detected_text:
+        for word, trigrams in words:
+            if word in found_patterns:
                 match_count += 1
-            elif len(word) >= 3:
-                # Check for partial matches
-                for i in range(len(word) - 2):
-                    substring = word[i:i+3]
-                    if substring in detected_text:
-                        partial_matches += 0.3
-                        break
+            elif any(trigram in found_patterns for trigram in trigrams):
+                # Partial match on any three-letter fragment
+                partial_matches += 0.3
         
         # Calculate confidence for this name variation
         if words:
@@ -342,23 +500,40 @@ def _calculate_match_confidence(product: Dict[str, Any], detected_text: str) ->
     
     return min(1.0, max_confidence)
 
-def _intelligent_mock_recognition(image_path: str) -> List[Dict[str, Any]]:
+def _read_simulated_latency() -> float:
+    """Read SNACKSCAN_SIMULATE_LATENCY, treating a missing or invalid value as no delay"""
+    value = os.getenv('SNACKSCAN_SIMULATE_LATENCY', '').strip()
+    if not value:
+        return 0.0
+    
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        logger.warning(f"Ignoring invalid SNACKSCAN_SIMULATE_LATENCY value: {value!r}")
+        return 0.0
+
+# Seconds of artificial delay added to mock recognition, read once at startup
+SIMULATED_LATENCY = _read_simulated_latency()
+
+def _intelligent_mock_recognition(image_bytes: bytes, filename: str) -> List[Dict[str, Any]]:
     """
     Intelligent mock recognition that analyzes image content to detect relevant products
     
     Args:
-        image_path: Path to the image file
+        image_bytes: Raw contents of the image
+        filename: Original filename of the upload, used as a recognition hint
         
     Returns:
         List of simulated detected products based on image analysis
     """
     logger.info("Using intelligent mock recognition with image content analysis")
     
-    # Simulate processing time
-    time.sleep(2)
+    # Optionally simulate processing time (e.g. for frontend demos)
+    if SIMULATED_LATENCY > 0:
+        time.sleep(SIMULATED_LATENCY)
     
     # Analyze image content for smart product detection
-    detected_text = _analyze_image_content(image_path)
+    detected_text = _analyze_image_content(image_bytes, filename)
     logger.info(f"Detected image characteristics: {detected_text}")
     
     # Match products based on image content
@@ -370,64 +545,85 @@ def _intelligent_mock_recognition(image_path: str) -> List[Dict[str, Any]]:
         return matched_products
     
     # Fallback to randomized selection if no specific matches
-    return _generate_randomized_products(image_path)
+    return _generate_randomized_products(image_bytes)
+
+# OpenCV decode flags by downscale factor, used to avoid full-size decodes
+_REDUCED_DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8
+}
 
-def _analyze_image_content(image_path: str) -> Dict[str, Any]:
+def _analyze_image_content(image_bytes: bytes, filename: str) -> Dict[str, Any]:
     """
     Analyze image content to detect colors, shapes, and potential product indicators
     
     Args:
-        image_path: Path to the image file
+        image_bytes: Raw contents of the image
+        filename: Original filename of the upload, used as a recognition hint
         
     Returns:
         Dictionary with image analysis results
     """
     try:
-        import numpy as np
-        from PIL import Image
-        
-        with Image.open(image_path) as img:
-            # Convert to RGB if needed
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-            
-            # Resize for faster processing
-            img_small = img.resize((100, 100))
-            img_array = np.array(img_small)
-            
-            # Analyze dominant colors
-            colors = {
-                'red': np.mean(img_array[:, :, 0]),
-                'green': np.mean(img_array[:, :, 1]), 
-                'blue': np.mean(img_array[:, :, 2])
-            }
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            # Only the header has been read at this point
+            width, height = img.size
             
-            # Determine dominant color
-            dominant_color = max(colors, key=colors.get)
-            
-            # Check brightness
-            brightness = np.mean(img_array)
-            
-            # Simple pattern detection based on variance
-            texture_variance = np.var(img_array)
-            
-            # Use filename as hint
-            filename_lower = image_path.lower()
-            
-            return {
-                'dominant_color': dominant_color,
-                'brightness': brightness,
-                'texture_variance': texture_variance,
-                'colors': colors,
-                'filename_hints': filename_lower,
-                'width': img.size[0],
-                'height': img.size[1]
-            }
+            # Decode at reduced size where possible; for JPEG libjpeg scales
+            # in the DCT domain instead of decoding every full-size pixel
+            scale = 1
+            for factor in (8, 4, 2):
+                if min(width, height) // factor >= 100:
+                    scale = factor
+                    break
+            bgr = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), _REDUCED_DECODE_FLAGS[scale])
+            if bgr is None:
+                # OpenCV cannot decode some formats (e.g. GIF); let PIL read those
+                bgr = cv2.cvtColor(np.asarray(img.convert('RGB')), cv2.COLOR_RGB2BGR)
+        
+        # Resize for faster processing
+        img_array = cv2.resize(bgr, (100, 100), interpolation=cv2.INTER_AREA)
+        
+        # Per-channel mean and standard deviation in a single pass over the
+        # uint8 buffer; channels stay in OpenCV's BGR order
+        channel_means, channel_stds = cv2.meanStdDev(img_array)
+        blue, green, red = channel_means.ravel()
+        
+        # Analyze dominant colors
+        colors = {
+            'red': float(red),
+            'green': float(green),
+            'blue': float(blue)
+        }
+        
+        # Determine dominant color
+        dominant_color = max(colors, key=colors.get)
+        
+        # Check brightness
+        brightness = float(channel_means.mean())
+        
+        # Simple pattern detection based on variance (pooled over all channels)
+        texture_variance = float((channel_stds ** 2).mean() + channel_means.var())
+        
+        # Use filename as hint
+        filename_lower = filename.lower()
+        
+        return {
+            'dominant_color': dominant_color,
+            'brightness': brightness,
+            'texture_variance': texture_variance,
+            'colors': colors,
+            'filename_hints': filename_lower,
+            'width': width,
+            'height': height
+        }
             
     except Exception as e:
         logger.warning(f"Image analysis failed: {e}")
         # Return basic analysis based on filename
-        filename_lower = image_path.lower()
+        filename_lower = filename.lower()
         return {
             'dominant_color': 'unknown',
             'brightness': 128,
@@ -438,6 +634,75 @@ def _analyze_image_content(image_path: str) -> Dict[str, Any]:
             'height': 480
         }
 
+def _products_named(*official_names: str) -> Tuple[Dict[str, Any], ...]:
+    """Catalog products with the given official names, in catalog order"""
+    return tuple(p for p in COMPREHENSIVE_VENDING_PRODUCTS if p['official'] in official_names)
+
+# Candidate products for each color bucket of _color_bucket
+_COLOR_BUCKETS = {
+    'brown': _products_named(
+        'Snickers Chocolate Bar', 'Hersheys Milk Chocolate Bar', 'Milky Way Chocolate Bar',
+        'Twix Caramel Cookie Bar', 'Kit Kat Wafer Bar'
+    ),
+    'red': _products_named(
+        'Coca-Cola Classic', 'Cheez-It Original Crackers'
+    ),
+    'blue': _products_named(
+        'Pepsi Cola', 'Oreo Chocolate Sandwich Cookies', 'Dasani Bottled Water'
+    ),
+    'orange': _products_named(
+        'Lays Classic Potato Chips', 'Cheetos Crunchy', 'Doritos Nacho Cheese',
+        'Reeses Peanut Butter Cups'
+    ),
+    'green': _products_named(
+        'Mountain Dew', 'Sprite Lemon-Lime Soda', 'Nature Valley Granola Bar',
+        'Gatorade Sports Drink'
+    )
+}
+
+# Popular products outside each bucket, used as filler suggestions
+_COLOR_BUCKET_OTHERS = {
+    bucket: tuple(p for p in COMPREHENSIVE_VENDING_PRODUCTS[:20] if p not in products)
+    for bucket, products in _COLOR_BUCKETS.items()
+}
+
+def _color_bucket(colors: Dict[str, float], dominant_color: str) -> Optional[str]:
+    """
+    Classify average image colors into a product color bucket
+    
+    Args:
+        colors: Mean red, green and blue values
+        dominant_color: Name of the strongest channel
+        
+    Returns:
+        Key into _COLOR_BUCKETS, or None if no bucket applies
+    """
+    red = colors.get('red', 0)
+    green = colors.get('green', 0)
+    blue = colors.get('blue', 0)
+    
+    # Brown/Dark images (Snickers, chocolate products)
+    if red > 80 and green > 60 and blue < 70:
+        return 'brown'
+    
+    # Red-dominant images (Coca-Cola, red packaging)
+    if dominant_color == 'red' or (red > 120 and red > green * 1.3):
+        return 'red'
+    
+    # Blue-dominant images (Pepsi, blue packaging)
+    if dominant_color == 'blue' or (blue > 110 and blue > red * 1.2):
+        return 'blue'
+    
+    # Orange/yellow images (Lays, Cheetos, etc.)
+    if (red + green) > blue * 1.8 and green > 80:
+        return 'orange'
+    
+    # Green images (Mountain Dew, Sprite, healthy items)
+    if dominant_color == 'green' or (green > 110 and green > red * 1.2):
+        return 'green'
+    
+    return None
+
 def _match_products_from_image_analysis(image_data: Dict[str, Any]) -> List[Dict[str, Any]]:
     """
     Match products based on image analysis results
@@ -455,9 +720,12 @@ def _match_products_from_image_analysis(image_data: Dict[str, Any]) -> List[Dict
     
     # Check filename for product hints
     filename_matches = []
-    for product in COMPREHENSIVE_VENDING_PRODUCTS:
-        for name in product['names']:
-            if name.replace(' ', '').replace('-', '').lower() in filename.replace(' ', '').replace('-', ''):
+    found_aliases = _find_patterns(
+        filename.replace(' ', '').replace('-', ''), _FILENAME_ALIAS_PATTERNS, _FILENAME_AUTOMATON
+    )
+    if found_aliases:
+        for alias, product in _FILENAME_ALIASES:
+            if alias in found_aliases:
                 confidence = 0.9 + random.random() * 0.05
                 filename_matches.append({
                     'id': _generate_id(),
@@ -469,55 +737,12 @@ def _match_products_from_image_analysis(image_data: Dict[str, Any]) -> List[Dict
                 })
     
     if filename_matches:
-        # Sort by confidence and return top matches
-        filename_matches.sort(key=lambda x: x['confidence'], reverse=True)
-        return filename_matches[:6]
+        # Return top matches by confidence
+        return heapq.nlargest(6, filename_matches, key=itemgetter('confidence'))
     
     # Color-based matching
-    color_matches = []
-    
-    # Brown/Dark images (Snickers, chocolate products)
-    if (colors.get('red', 0) > 80 and colors.get('green', 0) > 60 and colors.get('blue', 0) < 70):
-        brown_products = [
-            'Snickers Chocolate Bar', 'Hersheys Milk Chocolate Bar', 'Milky Way Chocolate Bar',
-            'Twix Caramel Cookie Bar', 'Kit Kat Wafer Bar'
-        ]
-        color_matches.extend([p for p in COMPREHENSIVE_VENDING_PRODUCTS 
-                            if p['official'] in brown_products])
-    
-    # Red-dominant images (Coca-Cola, red packaging)
-    elif dominant_color == 'red' or (colors.get('red', 0) > 120 and colors.get('red', 0) > colors.get('green', 0) * 1.3):
-        red_products = [
-            'Coca-Cola Classic', 'Cheez-It Original Crackers'
-        ]
-        color_matches.extend([p for p in COMPREHENSIVE_VENDING_PRODUCTS 
-                            if p['official'] in red_products])
-    
-    # Blue-dominant images (Pepsi, blue packaging)
-    elif dominant_color == 'blue' or (colors.get('blue', 0) > 110 and colors.get('blue', 0) > colors.get('red', 0) * 1.2):
-        blue_products = [
-            'Pepsi Cola', 'Oreo Chocolate Sandwich Cookies', 'Dasani Bottled Water'
-        ]
-        color_matches.extend([p for p in COMPREHENSIVE_VENDING_PRODUCTS 
-                            if p['official'] in blue_products])
-    
-    # Orange/yellow images (Lays, Cheetos, etc.)
-    elif (colors.get('red', 0) + colors.get('green', 0)) > colors.get('blue', 0) * 1.8 and colors.get('green', 0) > 80:
-        orange_products = [
-            'Lays Classic Potato Chips', 'Cheetos Crunchy', 'Doritos Nacho Cheese',
-            'Reeses Peanut Butter Cups'
-        ]
-        color_matches.extend([p for p in COMPREHENSIVE_VENDING_PRODUCTS 
-                            if p['official'] in orange_products])
-    
-    # Green images (Mountain Dew, Sprite, healthy items)
-    elif dominant_color == 'green' or (colors.get('green', 0) > 110 and colors.get('green', 0) > colors.get('red', 0) * 1.2):
-        green_products = [
-            'Mountain Dew', 'Sprite Lemon-Lime Soda', 'Nature Valley Granola Bar',
-            'Gatorade Sports Drink'
-        ]
-        color_matches.extend([p for p in COMPREHENSIVE_VENDING_PRODUCTS 
-                            if p['official'] in green_products])
+    bucket = _color_bucket(colors, dominant_color)
+    color_matches = _COLOR_BUCKETS[bucket] if bucket else ()
     
     # Convert color matches to result format
     if color_matches:
@@ -533,8 +758,7 @@ def _match_products_from_image_analysis(image_data: Dict[str, Any]) -> List[Dict
             })
         
         # Add a couple random products to make it realistic
-        other_products = [p for p in COMPREHENSIVE_VENDING_PRODUCTS[:20] 
-                         if p not in color_matches]
+        other_products = _COLOR_BUCKET_OTHERS[bucket]
         for product in random.sample(other_products, min(2, len(other_products))):
             results.append({
                 'id': _generate_id(),
@@ -546,17 +770,20 @@ def _match_products_from_image_analysis(image_data: Dict[str, Any]) -> List[Dict
             })
         
         # Sort by confidence
-        results.sort(key=lambda x: x['confidence'], reverse=True)
+        results.sort(key=itemgetter('confidence'), reverse=True)
         return results
     
     return []
 
-def _generate_randomized_products(image_path: str) -> List[Dict[str, Any]]:
+# Popular products used for the randomized fallback selection
+_TOP_PRODUCTS = tuple(p for p in COMPREHENSIVE_VENDING_PRODUCTS if p['popularity'] >= 75)
+
+def _generate_randomized_products(image_bytes: bytes) -> List[Dict[str, Any]]:
     """
     Generate randomized product selection as fallback
     
     Args:
-        image_path: Path to the image file
+        image_bytes: Raw contents of the image
         
     Returns:
         List of randomized products
@@ -565,7 +792,7 @@ def _generate_randomized_products(image_path: str) -> List[Dict[str, Any]]:
     
     # Use image size as seed for consistency
     try:
-        with Image.open(image_path) as img:
+        with Image.open(io.BytesIO(image_bytes)) as img:
             seed = (img.size[0] * img.size[1]) % 1000
     except Exception:
         seed = random.randint(0, 999)
@@ -573,8 +800,7 @@ def _generate_randomized_products(image_path: str) -> List[Dict[str, Any]]:
     random.seed(seed)
     
     # Select 6 random products from top items
-    top_products = [p for p in COMPREHENSIVE_VENDING_PRODUCTS if p['popularity'] >= 75]
-    selected = random.sample(top_products, min(6, len(top_products)))
+    selected = random.sample(_TOP_PRODUCTS, min(6, len(_TOP_PRODUCTS)))
     
     results = []
     for i, product in enumerate(selected):
@@ -592,14 +818,14 @@ def _generate_randomized_products(image_path: str) -> List[Dict[str, Any]]:
         })
     
     # Sort by confidence
-    results.sort(key=lambda x: x['confidence'], reverse=True)
+    results.sort(key=itemgetter('confidence'), reverse=True)
     
     logger.info(f"Randomized selection: {[p['name'] for p in results]}")
     return results
 
 def _generate_id() -> str:
     """Generate a random ID for products"""
-    return ''.join(random.choices('abcdefghijklmnopqrstuvwxyz0123456789', k=9))
+    return secrets.token_hex(5)[:9]
 
 def get_supported_formats() -> List[str]:
     """Get list of supported image formats"""
@@ -616,9 +842,10 @@ def validate_image(image_path: str) -> bool:
         True if valid, False otherwise
     """
     try:
+        # Image.open only reads the header, enough to identify the format
+        # without decoding the whole file
         with Image.open(image_path) as img:
-            img.verify()
-        return True
+            return img.format is not None and img.format.lower() in get_supported_formats()
     except Exception as e:
         logger.error(f"Image validation failed: {e}")
         return False
\ No newline at end of file
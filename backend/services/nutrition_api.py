@@ -5,11 +5,49 @@ Fetches nutrition data from multiple APIs with fallback strategy
 """
 
 import os
+import json
 import logging
 import requests
+import threading
 import time
-from typing import Dict, List, Optional, Any
+from bisect import bisect_right
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from functools import lru_cache, wraps
+from types import MappingProxyType
+from typing import Callable, Dict, List, Optional, Any, Tuple
 from urllib.parse import quote_plus
+from cachetools import LRUCache, TTLCache
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+# Optional Aho-Corasick automaton for single-pass product name matching
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+# Optional fast JSON parser for API responses
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Optional fuzzy matching for ranking USDA search results
+try:
+    from rapidfuzz import fuzz, utils as fuzz_utils
+    RAPIDFUZZ_AVAILABLE = True
+except ImportError:
+    RAPIDFUZZ_AVAILABLE = False
+
+# Optional Redis cache shared by all server processes
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +55,97 @@ logger = logging.getLogger(__name__)
 USDA_API_URL = 'https://api.nal.usda.gov/fdc/v1'
 EDAMAM_API_URL = 'https://api.edamam.com/api/nutrition-data/v2'
 SPOONACULAR_API_URL = 'https://api.spoonacular.com/food'
+USDA_SEARCH_DATA_TYPES = 'Branded,Foundation,SR Legacy,Survey (FNDDS)'
+
+# Threads doing background (prefetch) work; their API requests go to the
+# small prefetch pools below so they never queue ahead of user lookups
+_THREAD_STATE = threading.local()
+
+def _mark_background_thread() -> None:
+    """Thread initializer for the prefetch pools"""
+    _THREAD_STATE.background = True
+
+def _in_background() -> bool:
+    """Whether the current thread is doing background prefetch work"""
+    return getattr(_THREAD_STATE, 'background', False)
+
+# Shared worker pool for concurrent nutrition API requests
+_API_EXECUTOR = ThreadPoolExecutor(max_workers=16, thread_name_prefix='nutrition-api')
+
+# Separate pool for Edamam portion requests, which are submitted from inside
+# _API_EXECUTOR tasks and would deadlock if they waited on the same pool
+_PORTION_EXECUTOR = ThreadPoolExecutor(max_workers=16, thread_name_prefix='edamam-portion')
+
+# Equivalent pools for prefetch lookups
+_PREFETCH_API_EXECUTOR = ThreadPoolExecutor(
+    max_workers=2, thread_name_prefix='prefetch-api', initializer=_mark_background_thread
+)
+_PREFETCH_PORTION_EXECUTOR = ThreadPoolExecutor(
+    max_workers=4, thread_name_prefix='prefetch-portion', initializer=_mark_background_thread
+)
+
+# Wall-clock budget for one nutrition lookup across all APIs, in seconds
+NUTRITION_LOOKUP_BUDGET = 3.0
+# Seconds to wait on the preferred APIs before also asking the next one
+FANOUT_STAGGER = 1.0
+CONNECT_TIMEOUT = 0.5
+
+# Per-API circuit breakers: consecutive failures and when requests may resume
+CIRCUIT_BREAKER_THRESHOLD = 5
+CIRCUIT_BREAKER_COOLDOWN = 60.0
+_BREAKERS = {}
+_BREAKER_LOCK = threading.Lock()
+
+# Responses meaning the API refused the request: bad key, quota used up, rate limited
+_PROVIDER_FAILURE_STATUSES = frozenset({401, 402, 403, 429})
+
+# Shared HTTP session so connections to the nutrition APIs are kept alive;
+# transient 5xx responses and connection errors are retried by urllib3.
+# POST is retried too, since the only POST (USDA /foods) is a read
+_SESSION = requests.Session()
+_SESSION.mount('https://', HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=32,
+    max_retries=Retry(
+        total=2,
+        backoff_factor=0.3,
+        status_forcelist=[500, 502, 503, 504],
+        allowed_methods=frozenset({'GET', 'POST'})
+    )
+))
+
+# In-process nutrition caches, keyed on the stripped product name
+NUTRITION_CACHE_TTL = 6 * 60 * 60  # API results are effectively static for hours
+FALLBACK_CACHE_TTL = 5 * 60  # Mock/estimated results, retried sooner
+_NUTRITION_CACHE = TTLCache(maxsize=1024, ttl=NUTRITION_CACHE_TTL)
+_FALLBACK_CACHE = TTLCache(maxsize=1024, ttl=FALLBACK_CACHE_TTL)
+_CACHE_LOCK = threading.Lock()
+_MISSING = object()
+
+# Lookups in progress, keyed like the caches, so concurrent requests for the
+# same product (including prefetches) share one set of API calls
+_IN_FLIGHT: Dict[str, Future] = {}
+
+# Shared Redis cache, enabled by setting REDIS_HOST
+_REDIS_CLIENT = None
+_REDIS_KEY_PREFIX = 'snackscan:nutrition:'
+REDIS_SOCKET_TIMEOUT = 0.05
+
+# Prefetching of the products a client is likely to scan next, learned from
+# which products followed each other in earlier scans
+PREFETCH_TOP_K = 3
+PREFETCH_MAX_PENDING = 4
+PREFETCH_MAX_FOLLOWERS = 32
+_SCAN_TRANSITIONS = LRUCache(maxsize=512)  # product -> Counter of products scanned next
+_LAST_SCANNED = LRUCache(maxsize=4096)  # client -> product it scanned last
+_SCAN_LOCK = threading.Lock()
+_PREFETCH_SLOTS = threading.BoundedSemaphore(PREFETCH_MAX_PENDING)
+_PREFETCH_EXECUTOR = ThreadPoolExecutor(
+    max_workers=PREFETCH_MAX_PENDING, thread_name_prefix='nutrition-prefetch', initializer=_mark_background_thread
+)
+
+# Sources that mean no API returned data for the product
+_FALLBACK_SOURCES = {'Enhanced Vending Database', 'Estimated Values'}
 
 # Enhanced product search terms for better API results
 PRODUCT_SEARCH_TERMS = {
@@ -67,10 +196,218 @@ PRODUCT_SEARCH_TERMS = {
     'Vitaminwater': ['vitamin water', 'vitaminwater enhanced', 'enhanced water'],
 }
 
+# Lowercased product keys mapped to their search terms, in PRODUCT_SEARCH_TERMS order
+_NORMALIZED_INDEX = {product.lower(): tuple(terms) for product, terms in PRODUCT_SEARCH_TERMS.items()}
+_NORMALIZED_KEYS = tuple(_NORMALIZED_INDEX)
+
+_SEPARATOR_TABLE = str.maketrans('-_', '  ')
+
+def _build_key_blob(keys: Tuple[str, ...]) -> Tuple[str, List[int]]:
+    """
+    Join keys into one string so "text inside a key" is a single find()
+    
+    Args:
+        keys: Keys in order of preference
+        
+    Returns:
+        Newline-joined keys and the start offset of each key
+    """
+    starts = []
+    offset = 0
+    for key in keys:
+        starts.append(offset)
+        offset += len(key) + 1
+    return '\n'.join(keys), starts
+
+def _first_key_containing(text: str, blob: Tuple[str, List[int]]) -> int:
+    """Position of the earliest key containing text, or -1"""
+    joined, starts = blob
+    if '\n' in text:
+        return -1
+    
+    # Keys are laid out in order, so the first hit is in the earliest key
+    position = joined.find(text)
+    return bisect_right(starts, position) - 1 if position != -1 else -1
+
+def _build_automaton(patterns: Dict[str, int]) -> Optional[Any]:
+    """Build an automaton reporting each pattern's key position, or None without pyahocorasick"""
+    if not AHOCORASICK_AVAILABLE:
+        return None
+    
+    automaton = ahocorasick.Automaton()
+    for pattern, position in patterns.items():
+        automaton.add_word(pattern, position)
+    automaton.make_automaton()
+    return automaton
+
+_KEY_BLOB = _build_key_blob(_NORMALIZED_KEYS)
+_KEY_AUTOMATON = _build_automaton({key: i for i, key in enumerate(_NORMALIZED_KEYS)})
+
 def get_nutrition_data(product_name: str) -> Optional[Dict[str, Any]]:
     """
     Get nutrition data for a product using multiple API sources
     
+    Args:
+        product_name: Name of the product to look up
+        
+    Returns:
+        Nutrition data dictionary or None if not found
+    """
+    cache_key = product_name.strip()
+    in_flight = owned = None
+    
+    with _CACHE_LOCK:
+        cached = _get_cached_locked(cache_key)
+        if cached is _MISSING:
+            in_flight = _IN_FLIGHT.get(cache_key)
+            if in_flight is None:
+                owned = _IN_FLIGHT[cache_key] = Future()
+    
+    if cached is not _MISSING:
+        logger.info(f"Using cached nutrition for: {product_name}")
+        return dict(cached) if cached else cached
+    
+    if in_flight is not None:
+        # Another request or a prefetch is already looking this product up
+        logger.info(f"Waiting for in-flight nutrition lookup for: {product_name}")
+        result = in_flight.result()
+        return dict(result) if result else result
+    
+    try:
+        result = _fetch_and_cache(cache_key, product_name)
+    except BaseException as e:
+        with _CACHE_LOCK:
+            _IN_FLIGHT.pop(cache_key, None)
+        owned.set_exception(e)
+        raise
+    
+    owned.set_result(result)
+    return dict(result) if result else result
+
+def _fetch_and_cache(cache_key: str, product_name: str) -> Optional[Dict[str, Any]]:
+    """Look a product up in the shared cache or the APIs and cache the result"""
+    # Another worker process may already have looked this product up
+    result = _redis_get(cache_key)
+    from_shared_cache = result is not None
+    if from_shared_cache:
+        logger.info(f"Using shared cached nutrition for: {product_name}")
+    else:
+        result = _lookup_nutrition_data(product_name)
+    
+    # Fallback results are only kept briefly so real data is fetched again
+    # once the APIs recover. The lookup leaves _IN_FLIGHT in the same step, so
+    # later requests always find it in one place or the other
+    is_fallback = not result or result.get('source') in _FALLBACK_SOURCES
+    with _CACHE_LOCK:
+        (_FALLBACK_CACHE if is_fallback else _NUTRITION_CACHE)[cache_key] = result
+        del _IN_FLIGHT[cache_key]
+    
+    if result and not from_shared_cache:
+        _redis_set(cache_key, result, FALLBACK_CACHE_TTL if is_fallback else NUTRITION_CACHE_TTL)
+    
+    return result
+
+def _get_cached_locked(cache_key: str) -> Any:
+    """Look a product up in the in-process caches, returning _MISSING on a miss; caller holds _CACHE_LOCK"""
+    for cache in (_NUTRITION_CACHE, _FALLBACK_CACHE):
+        cached = cache.get(cache_key, _MISSING)
+        if cached is not _MISSING:
+            return cached
+    return _MISSING
+
+def _is_cached_or_in_flight(cache_key: str) -> bool:
+    """Whether a product is cached in-process or already being looked up"""
+    with _CACHE_LOCK:
+        return cache_key in _IN_FLIGHT or _get_cached_locked(cache_key) is not _MISSING
+
+def record_scan(client_id: str, product_name: str) -> None:
+    """
+    Record that a client looked up a product and warm the cache for the
+    products most often looked up after it
+    
+    Args:
+        client_id: Scan session id identifying one client
+        product_name: Name of the product the client just looked up
+    """
+    product = product_name.strip()
+    
+    with _SCAN_LOCK:
+        previous = _LAST_SCANNED.get(client_id)
+        _LAST_SCANNED[client_id] = product
+        
+        if previous and previous != product:
+            followers = _SCAN_TRANSITIONS.get(previous)
+            if followers is None:
+                followers = _SCAN_TRANSITIONS[previous] = Counter()
+            followers[product] += 1
+            if len(followers) > PREFETCH_MAX_FOLLOWERS:
+                # Forget the rarely seen followers
+                _SCAN_TRANSITIONS[previous] = Counter(dict(followers.most_common(PREFETCH_MAX_FOLLOWERS // 2)))
+        
+        followers = _SCAN_TRANSITIONS.get(product)
+        likely_next = [name for name, _ in followers.most_common(PREFETCH_TOP_K)] if followers else []
+    
+    for name in likely_next:
+        if _is_cached_or_in_flight(name):
+            continue
+        
+        # Cap outstanding prefetches so they cannot exhaust API rate limits
+        if not _PREFETCH_SLOTS.acquire(blocking=False):
+            break
+        future = _PREFETCH_EXECUTOR.submit(_prefetch_nutrition, name)
+        future.add_done_callback(lambda _: _PREFETCH_SLOTS.release())
+
+def _prefetch_nutrition(product_name: str) -> None:
+    """Look up a product in the background so a later request hits the cache"""
+    try:
+        logger.info(f"Prefetching nutrition for: {product_name}")
+        get_nutrition_data(product_name)
+    except Exception as e:
+        logger.error(f"Nutrition prefetch error: {e}")
+
+def _get_redis_client() -> Optional[Any]:
+    """Return the shared Redis client, or None if Redis is not configured"""
+    global _REDIS_CLIENT
+    if _REDIS_CLIENT is None and REDIS_AVAILABLE and os.getenv('REDIS_HOST'):
+        _REDIS_CLIENT = redis.Redis(
+            host=os.getenv('REDIS_HOST'),
+            port=int(os.getenv('REDIS_PORT', 6379)),
+            socket_timeout=REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=REDIS_SOCKET_TIMEOUT
+        )
+    return _REDIS_CLIENT
+
+def _redis_get(cache_key: str) -> Optional[Dict[str, Any]]:
+    """Read nutrition data from the shared cache; any Redis error counts as a miss"""
+    client = _get_redis_client()
+    if client is None:
+        return None
+    
+    try:
+        cached = client.get(_REDIS_KEY_PREFIX + cache_key)
+        if cached is None:
+            return None
+        return orjson.loads(cached) if ORJSON_AVAILABLE else json.loads(cached)
+    except Exception as e:
+        logger.warning(f"Shared nutrition cache read failed: {e}")
+        return None
+
+def _redis_set(cache_key: str, value: Dict[str, Any], ttl: int) -> None:
+    """Write nutrition data to the shared cache, ignoring Redis errors"""
+    client = _get_redis_client()
+    if client is None:
+        return
+    
+    try:
+        payload = orjson.dumps(value) if ORJSON_AVAILABLE else json.dumps(value)
+        client.setex(_REDIS_KEY_PREFIX + cache_key, ttl, payload)
+    except Exception as e:
+        logger.warning(f"Shared nutrition cache write failed: {e}")
+
+def _lookup_nutrition_data(product_name: str) -> Optional[Dict[str, Any]]:
+    """
+    Look up nutrition data from the APIs, bypassing the cache
+    
     Args:
         product_name: Name of the product to look up
         
@@ -84,43 +421,26 @@ def get_nutrition_data(product_name: str) -> Optional[Dict[str, Any]]:
         search_terms = _get_optimized_search_terms(product_name)
         logger.info(f"Using search terms: {search_terms}")
         
-        # Try APIs in order of preference
-        for search_term in search_terms:
-            # 1. Try USDA API (free, comprehensive)
-            usda_key = os.getenv('USDA_API_KEY')
-            if usda_key:
-                logger.info(f"Trying USDA API with: {search_term}")
-                result = _fetch_usda_nutrition(search_term, usda_key)
-                if result:
-                    logger.info("Found data in USDA database")
-                    return result
-            
-            # 2. Try Edamam API (free tier available)
-            edamam_id = os.getenv('EDAMAM_APP_ID')
-            edamam_key = os.getenv('EDAMAM_APP_KEY')
-            if edamam_id and edamam_key:
-                logger.info(f"Trying Edamam API with: {search_term}")
-                result = _fetch_edamam_nutrition(search_term, edamam_id, edamam_key)
-                if result:
-                    logger.info("Found data in Edamam database")
-                    return result
-            
-            # 3. Try Spoonacular API (paid but reliable)
-            spoon_key = os.getenv('SPOONACULAR_API_KEY')
-            if spoon_key:
-                logger.info(f"Trying Spoonacular API with: {search_term}")
-                result = _fetch_spoonacular_nutrition(search_term, spoon_key)
-                if result:
-                    logger.info("Found data in Spoonacular database")
-                    return result
+        deadline = time.monotonic() + NUTRITION_LOOKUP_BUDGET
+        apis = _get_configured_apis()
+        candidates = [
+            (api_name, fetch, search_term, credentials)
+            for search_term in search_terms
+            for api_name, fetch, credentials in apis
+        ]
         
-        # 4. Try FoodData Central fallback (no API key needed)
-        logger.info("Trying FoodData Central fallback")
-        result = _fetch_fooddata_fallback(search_terms[0])
+        result = _fetch_first_result(candidates, deadline)
         if result:
-            logger.info("Found data in FoodData Central fallback")
             return result
         
+        # 4. Try FoodData Central fallback (no API key needed)
+        if deadline - time.monotonic() >= 0.1:
+            logger.info("Trying FoodData Central fallback")
+            result = _fetch_fooddata_fallback(search_terms[0], deadline)
+            if result:
+                logger.info("Found data in FoodData Central fallback")
+                return result
+        
         # 5. Use enhanced mock data
         logger.info("Using enhanced mock nutrition data")
         return _get_enhanced_mock_data(product_name)
@@ -129,198 +449,461 @@ def get_nutrition_data(product_name: str) -> Optional[Dict[str, Any]]:
         logger.error(f"Error getting nutrition data: {e}")
         return _get_enhanced_mock_data(product_name)
 
-def _get_optimized_search_terms(product_name: str) -> List[str]:
-    """Get optimized search terms for better API results"""
-    normalized = product_name.lower().strip()
+def _fetch_first_result(candidates: List[Tuple[str, Callable[..., Optional[Dict[str, Any]]], str, Tuple[str, ...]]],
+                        deadline: float) -> Optional[Dict[str, Any]]:
+    """
+    Query (API, search term) candidates in order of preference with staggered starts
     
-    # Check for specific product mappings
-    for product, terms in PRODUCT_SEARCH_TERMS.items():
-        if product.lower() in normalized or normalized in product.lower():
-            return terms
+    The most preferred candidate starts immediately; the next one starts as soon
+    as every started candidate has missed, or after FANOUT_STAGGER seconds
+    without an answer. Results are still accepted strictly in order of
+    preference, and candidates that were never needed are never sent.
     
-    # Generate fallback terms
-    fallback_terms = [
-        product_name,
-        product_name.replace('-', ' ').replace('_', ' '),
-        ' '.join(product_name.split()[:2]),  # First two words
-        product_name.split()[0] if product_name.split() else product_name,  # Brand name
-    ]
+    Args:
+        candidates: (API name, fetch function, search term, credentials) tuples
+        deadline: time.monotonic() value by which the lookup must finish
+        
+    Returns:
+        First result in order of preference, or None
+    """
+    executor = _PREFETCH_API_EXECUTOR if _in_background() else _API_EXECUTOR
+    started = []
+    next_start = 0.0
     
-    return [term for term in fallback_terms if len(term.strip()) > 2]
-
-def _fetch_usda_nutrition(search_term: str, api_key: str) -> Optional[Dict[str, Any]]:
-    """Fetch nutrition data from USDA FoodData Central API"""
+    def start_next():
+        nonlocal next_start
+        api_name, fetch, search_term, credentials = candidates[len(started)]
+        logger.info(f"Trying {api_name} API with: {search_term}")
+        started.append((api_name, executor.submit(fetch, search_term, *credentials, deadline)))
+        next_start = time.monotonic() + FANOUT_STAGGER
+    
+    if not candidates:
+        return None
+    
+    start_next()
+    accepted = 0
     try:
-        # Try branded foods first, then all foods
-        search_types = [
-            {'dataType': 'Branded', 'pageSize': 3},
-            {'dataType': '', 'pageSize': 5}
-        ]
-        
-        for search_config in search_types:
-            params = {
-                'query': search_term,
-                'api_key': api_key,
-                'pageSize': search_config['pageSize']
-            }
-            
-            if search_config['dataType']:
-                params['dataType'] = search_config['dataType']
+        while accepted < len(started):
+            api_name, future = started[accepted]
+            now = time.monotonic()
+            if now >= deadline:
+                logger.warning("Nutrition API lookups ran out of time")
+                return None
             
-            response = requests.get(f"{USDA_API_URL}/foods/search", params=params, timeout=10)
-            
-            if response.status_code != 200:
+            # Wait for the most preferred pending answer, but no longer than
+            # until the next candidate is due to start
+            more = len(started) < len(candidates)
+            wait_until = min(deadline, next_start) if more else deadline
+            try:
+                result = future.result(timeout=max(0.0, wait_until - now))
+            except FuturesTimeoutError:
+                if more and time.monotonic() >= next_start:
+                    start_next()
                 continue
             
-            data = response.json()
+            if result:
+                logger.info(f"Found data in {api_name} database")
+                return result
             
-            if data.get('foods') and len(data['foods']) > 0:
-                # Find best match
-                best_food = data['foods'][0]
-                for food in data['foods']:
-                    if search_term.lower() in food.get('description', '').lower():
-                        best_food = food
-                        break
-                
-                # Get detailed nutrition data
-                detail_response = requests.get(
-                    f"{USDA_API_URL}/food/{best_food['fdcId']}",
-                    params={'api_key': api_key},
-                    timeout=10
-                )
-                
-                if detail_response.status_code == 200:
-                    detail_data = detail_response.json()
-                    return _parse_usda_nutrition(detail_data)
+            accepted += 1
+            if accepted == len(started) and more:
+                # Everything started so far missed, so move on right away
+                start_next()
         
         return None
+    finally:
+        # Drop lookups that are no longer needed
+        for _, future in started:
+            future.cancel()
+
+def _get_configured_apis() -> List[Tuple[str, Callable[..., Optional[Dict[str, Any]]], Tuple[str, ...]]]:
+    """Get (name, fetch function, credentials) for each configured API, in order of preference"""
+    apis = []
+    
+    # 1. USDA API (free, comprehensive)
+    usda_key = os.getenv('USDA_API_KEY')
+    if usda_key:
+        apis.append(('USDA', _fetch_usda_nutrition, (usda_key,)))
+    
+    # 2. Edamam API (free tier available)
+    edamam_id = os.getenv('EDAMAM_APP_ID')
+    edamam_key = os.getenv('EDAMAM_APP_KEY')
+    if edamam_id and edamam_key:
+        apis.append(('Edamam', _fetch_edamam_nutrition, (edamam_id, edamam_key)))
+    
+    # 3. Spoonacular API (paid but reliable)
+    spoon_key = os.getenv('SPOONACULAR_API_KEY')
+    if spoon_key:
+        apis.append(('Spoonacular', _fetch_spoonacular_nutrition, (spoon_key,)))
+    
+    return apis
+
+@lru_cache(maxsize=2048)
+def _get_optimized_search_terms(product_name: str) -> Tuple[str, ...]:
+    """Get optimized search terms for better API results"""
+    normalized = product_name.lower().strip()
+    
+    # Check for specific product mappings
+    terms = _NORMALIZED_INDEX.get(normalized)
+    if terms is not None:
+        return terms
+    
+    product = _find_product_key(normalized)
+    if product is not None:
+        return _NORMALIZED_INDEX[product]
+    
+    # Generate fallback terms
+    words = product_name.split()
+    fallback_terms = (
+        product_name,
+        product_name.translate(_SEPARATOR_TABLE),
+        ' '.join(words[:2]),  # First two words
+        words[0] if words else product_name,  # Brand name
+    )
+    
+    return tuple(term for term in fallback_terms if len(term.strip()) > 2)
+
+def _find_product_key(normalized: str) -> Optional[str]:
+    """
+    Find the first product key that contains, or is contained in, the name
+    
+    Args:
+        normalized: Lowercased, stripped product name
         
-    except Exception as e:
-        logger.error(f"USDA API error: {e}")
-        return None
+    Returns:
+        Earliest matching key in PRODUCT_SEARCH_TERMS order, or None
+    """
+    best = len(_NORMALIZED_KEYS)
+    
+    # Key inside the name
+    if _KEY_AUTOMATON is not None:
+        for _, position in _KEY_AUTOMATON.iter(normalized):
+            best = min(best, position)
+    else:
+        for i, key in enumerate(_NORMALIZED_KEYS):
+            if key in normalized:
+                best = i
+                break
+    
+    # Name inside a key
+    position = _first_key_containing(normalized, _KEY_BLOB)
+    if position != -1:
+        best = min(best, position)
+    
+    return _NORMALIZED_KEYS[best] if best < len(_NORMALIZED_KEYS) else None
 
-def _fetch_edamam_nutrition(search_term: str, app_id: str, app_key: str) -> Optional[Dict[str, Any]]:
-    """Fetch nutrition data from Edamam API"""
-    try:
-        # Try different portion descriptions
-        portions = [
-            f"1 serving {search_term}",
-            f"1 package {search_term}",
-            f"1 can {search_term}",
-            f"100g {search_term}"
-        ]
+def _request_timeout(deadline: float) -> Tuple[float, float]:
+    """(connect, read) timeout for a request that must finish by the deadline"""
+    remaining = max(0.05, deadline - time.monotonic())
+    return min(CONNECT_TIMEOUT, remaining), remaining
+
+def _circuit_breaker(name: str) -> Callable:
+    """
+    Wrap a fetcher so repeated failures stop calls to its API for a while
+    
+    Exceptions from the fetcher (connection errors, timeouts, 5xx responses
+    left after retries, refused requests) are logged and count as failures; after
+    CIRCUIT_BREAKER_THRESHOLD in a row the fetcher returns None without
+    calling the API until CIRCUIT_BREAKER_COOLDOWN has passed.
+    
+    Args:
+        name: API name used for logging and as the breaker key
         
-        for portion in portions:
-            params = {
-                'app_id': app_id,
-                'app_key': app_key,
-                'nutrition-type': 'cooking',
-                'ingr': portion
-            }
+    Returns:
+        Decorator for a fetch function
+    """
+    def decorator(fetch: Callable[..., Optional[Dict[str, Any]]]) -> Callable[..., Optional[Dict[str, Any]]]:
+        breaker = _BREAKERS.setdefault(name, {'fails': 0, 'open_until': 0.0})
+        
+        @wraps(fetch)
+        def wrapper(*args, **kwargs):
+            if time.monotonic() < breaker['open_until']:
+                logger.info(f"{name} circuit open, skipping request")
+                return None
             
-            response = requests.get(EDAMAM_API_URL, params=params, timeout=10)
+            try:
+                result = fetch(*args, **kwargs)
+            except Exception as e:
+                logger.error(f"{name} error: {e}")
+                with _BREAKER_LOCK:
+                    breaker['fails'] += 1
+                    if breaker['fails'] >= CIRCUIT_BREAKER_THRESHOLD:
+                        logger.warning(f"{name} failed {breaker['fails']} times in a row, pausing requests")
+                        breaker['open_until'] = time.monotonic() + CIRCUIT_BREAKER_COOLDOWN
+                        breaker['fails'] = 0
+                return None
             
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('calories', 0) > 0:
-                    return _parse_edamam_nutrition(data, search_term)
+            with _BREAKER_LOCK:
+                breaker['fails'] = 0
+            return result
         
+        return wrapper
+    
+    return decorator
+
+def _check_provider_status(response: requests.Response) -> None:
+    """
+    Raise if the API refused the request outright, so its circuit breaker counts it
+    
+    A bad key, a used-up quota or rate limiting is an API failure; other non-200
+    answers such as 404 still just mean "no data".
+    
+    Raises:
+        requests.HTTPError: For 401, 402, 403 and 429 responses
+    """
+    if response.status_code in _PROVIDER_FAILURE_STATUSES:
+        response.raise_for_status()
+
+def _parse_json(response: requests.Response) -> Any:
+    """Decode a JSON response body, with orjson when it is installed"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(response.content)
+    return response.json()
+
+@_circuit_breaker('USDA API')
+def _fetch_usda_nutrition(search_term: str, api_key: str, deadline: float) -> Optional[Dict[str, Any]]:
+    """Fetch nutrition data from USDA FoodData Central API"""
+    # Search branded and generic foods in one request
+    params = {
+        'query': search_term,
+        'api_key': api_key,
+        'pageSize': 8,
+        'dataType': USDA_SEARCH_DATA_TYPES
+    }
+    
+    response = _SESSION.get(f"{USDA_API_URL}/foods/search", params=params, timeout=_request_timeout(deadline))
+    _check_provider_status(response)
+    
+    if response.status_code != 200:
         return None
+    
+    data = _parse_json(response)
+    
+    if data.get('foods'):
+        # Branded foods match vending products best, so they are tried first
+        ranked = _rank_usda_candidates(search_term, data['foods'])
+        candidates = (
+            [food for food in ranked if food.get('dataType') == 'Branded']
+            + [food for food in ranked if food.get('dataType') != 'Branded']
+        )
         
-    except Exception as e:
-        logger.error(f"Edamam API error: {e}")
-        return None
+        # Fetch details for every candidate in one request and keep the
+        # best ranked one USDA returns
+        details = _fetch_usda_details([food['fdcId'] for food in candidates], api_key, deadline)
+        for food in candidates:
+            detail_data = details.get(food['fdcId'])
+            if detail_data:
+                return _parse_usda_nutrition(detail_data)
+    
+    return None
 
-def _fetch_spoonacular_nutrition(search_term: str, api_key: str) -> Optional[Dict[str, Any]]:
-    """Fetch nutrition data from Spoonacular API"""
-    try:
-        # Search for products
-        search_params = {
-            'query': search_term,
-            'apiKey': api_key,
-            'number': 3
-        }
+def _rank_usda_candidates(search_term: str, foods: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Order USDA search results from best to worst match for the search term
+    
+    Args:
+        search_term: Term the foods were searched with
+        foods: Foods from a USDA search response, in search order
         
-        search_response = requests.get(
-            f"{SPOONACULAR_API_URL}/products/search",
-            params=search_params,
-            timeout=10
+    Returns:
+        The same foods, best match first
+    """
+    if RAPIDFUZZ_AVAILABLE:
+        # Weighted similarity of each description; ties keep search order
+        return sorted(
+            foods,
+            key=lambda food: fuzz.WRatio(search_term, food.get('description', ''), processor=fuzz_utils.default_process),
+            reverse=True
         )
+    
+    # Without rapidfuzz, move the first description containing the term to the front
+    term = search_term.lower()
+    for i, food in enumerate(foods):
+        if term in food.get('description', '').lower():
+            return [food] + foods[:i] + foods[i + 1:]
+    return foods
+
+# USDA nutrient numbers behind _USDA_NUTRIENT_MAP, so detail responses only
+# carry the nutrients we parse: energy (kcal and Atwater), protein, carbs,
+# fat, fiber, sugars and sodium. The filter only takes whole nutrient numbers,
+# so variants such as carbohydrate by summation (205.2) and sugars, total
+# (269.3) are never returned and foods reporting only those lack carbs/sugar
+_USDA_NUTRIENT_NUMBERS = [208, 957, 958, 203, 205, 204, 291, 269, 307]
+
+def _fetch_usda_details(fdc_ids: List[int], api_key: str, deadline: float) -> Dict[int, Dict[str, Any]]:
+    """
+    Fetch full USDA food details for several foods in a single request
+    
+    Args:
+        fdc_ids: FoodData Central ids, at most 20
+        api_key: USDA API key
+        deadline: time.monotonic() value by which the lookup must finish
         
-        if search_response.status_code != 200:
-            return None
-        
-        search_data = search_response.json()
-        
-        if search_data.get('products'):
-            for product in search_data['products'][:3]:
-                # Get detailed nutrition info
-                detail_response = requests.get(
-                    f"{SPOONACULAR_API_URL}/products/{product['id']}",
-                    params={'apiKey': api_key},
-                    timeout=10
-                )
-                
-                if detail_response.status_code == 200:
-                    detail_data = detail_response.json()
-                    if detail_data.get('nutrition') and detail_data['nutrition'].get('nutrients'):
-                        return _parse_spoonacular_nutrition(detail_data)
-        
-        return None
+    Returns:
+        Food details keyed by fdcId; foods USDA did not return are omitted
         
-    except Exception as e:
-        logger.error(f"Spoonacular API error: {e}")
-        return None
+    Raises:
+        requests.HTTPError: If the detail request fails, so the USDA circuit
+        breaker counts it
+    """
+    response = _SESSION.post(
+        f"{USDA_API_URL}/foods",
+        params={'api_key': api_key},
+        json={'fdcIds': fdc_ids[:20], 'format': 'full', 'nutrients': _USDA_NUTRIENT_NUMBERS},
+        timeout=_request_timeout(deadline)
+    )
+    
+    response.raise_for_status()
+    
+    return {food['fdcId']: food for food in _parse_json(response) if food and 'fdcId' in food}
 
-def _fetch_fooddata_fallback(search_term: str) -> Optional[Dict[str, Any]]:
-    """Fetch from FoodData Central without API key (limited)"""
+@_circuit_breaker('Edamam API')
+def _fetch_edamam_nutrition(search_term: str, app_id: str, app_key: str, deadline: float) -> Optional[Dict[str, Any]]:
+    """Fetch nutrition data from Edamam API"""
+    # Try different portion descriptions
+    portions = [
+        f"1 serving {search_term}",
+        f"1 package {search_term}",
+        f"1 can {search_term}",
+        f"100g {search_term}"
+    ]
+    
+    # Request every portion at once, but still prefer them in the order above
+    portion_executor = _PREFETCH_PORTION_EXECUTOR if _in_background() else _PORTION_EXECUTOR
+    lookups = [
+        portion_executor.submit(_fetch_edamam_portion, portion, app_id, app_key, deadline)
+        for portion in portions
+    ]
+    
     try:
-        params = {
-            'query': search_term,
-            'pageSize': 1
-        }
-        
-        response = requests.get(
-            'https://api.nal.usda.gov/fdc/v1/foods/search',
-            params=params,
-            timeout=10
-        )
-        
-        if response.status_code == 200:
-            data = response.json()
-            if data.get('foods') and len(data['foods']) > 0:
-                return _parse_usda_nutrition(data['foods'][0])
-        
-        return None
-        
-    except Exception as e:
-        logger.error(f"FoodData fallback error: {e}")
+        for future in lookups:
+            data = future.result()
+            if data:
+                return _parse_edamam_nutrition(data, search_term)
+    finally:
+        for future in lookups:
+            future.cancel()
+    
+    return None
+
+def _fetch_edamam_portion(portion: str, app_id: str, app_key: str, deadline: float) -> Optional[Dict[str, Any]]:
+    """Fetch Edamam data for one portion description, or None if it has no calories"""
+    params = {
+        'app_id': app_id,
+        'app_key': app_key,
+        'nutrition-type': 'cooking',
+        'ingr': portion
+    }
+    
+    response = _SESSION.get(EDAMAM_API_URL, params=params, timeout=_request_timeout(deadline))
+    _check_provider_status(response)
+    
+    if response.status_code == 200:
+        data = _parse_json(response)
+        if data.get('calories', 0) > 0:
+            return data
+    
+    return None
+
+@_circuit_breaker('Spoonacular API')
+def _fetch_spoonacular_nutrition(search_term: str, api_key: str, deadline: float) -> Optional[Dict[str, Any]]:
+    """Fetch nutrition data from Spoonacular API"""
+    # Search for products
+    search_params = {
+        'query': search_term,
+        'apiKey': api_key,
+        'number': 3
+    }
+    
+    search_response = _SESSION.get(
+        f"{SPOONACULAR_API_URL}/products/search",
+        params=search_params,
+        timeout=_request_timeout(deadline)
+    )
+    
+    _check_provider_status(search_response)
+    
+    if search_response.status_code != 200:
         return None
+    
+    search_data = _parse_json(search_response)
+    
+    if search_data.get('products'):
+        for product in search_data['products'][:3]:
+            # Get detailed nutrition info
+            detail_response = _SESSION.get(
+                f"{SPOONACULAR_API_URL}/products/{product['id']}",
+                params={'apiKey': api_key},
+                timeout=_request_timeout(deadline)
+            )
+            
+            _check_provider_status(detail_response)
+            
+            if detail_response.status_code == 200:
+                detail_data = _parse_json(detail_response)
+                if detail_data.get('nutrition') and detail_data['nutrition'].get('nutrients'):
+                    return _parse_spoonacular_nutrition(detail_data)
+    
+    return None
+
+@_circuit_breaker('FoodData fallback')
+def _fetch_fooddata_fallback(search_term: str, deadline: float) -> Optional[Dict[str, Any]]:
+    """Fetch from FoodData Central without API key (limited)"""
+    params = {
+        'query': search_term,
+        'pageSize': 1
+    }
+    
+    response = _SESSION.get(
+        'https://api.nal.usda.gov/fdc/v1/foods/search',
+        params=params,
+        timeout=_request_timeout(deadline)
+    )
+    
+    _check_provider_status(response)
+    
+    if response.status_code == 200:
+        data = _parse_json(response)
+        if data.get('foods') and len(data['foods']) > 0:
+            return _parse_usda_nutrition(data['foods'][0])
+    
+    return None
+
+# USDA nutrient names (lowercased) mapped to our nutrient fields
+_USDA_NUTRIENT_MAP = {
+    'energy': 'calories',
+    'energy (atwater general factors)': 'calories',
+    'energy (atwater specific factors)': 'calories',
+    'protein': 'protein',
+    'carbohydrate, by difference': 'carbs',
+    'total lipid (fat)': 'fat',
+    'fiber, total dietary': 'fiber',
+    'sugars, total including nlea': 'sugar',
+    'sodium, na': 'sodium',
+}
 
 def _parse_usda_nutrition(usda_data: Dict[str, Any]) -> Dict[str, Any]:
     """Parse USDA nutrition data into standard format"""
     nutrients = {}
     
-    if usda_data.get('foodNutrients'):
-        for nutrient in usda_data['foodNutrients']:
-            name = nutrient.get('nutrient', {}).get('name', '').lower()
-            value = nutrient.get('amount', 0)
-            unit = nutrient.get('nutrient', {}).get('unitName', '')
-            
-            if 'energy' in name or 'caloric' in name:
+    units = {}
+    
+    for food_nutrient in usda_data.get('foodNutrients') or ():
+        nutrient = food_nutrient.get('nutrient') or {}
+        field = _USDA_NUTRIENT_MAP.get(nutrient.get('name', '').lower())
+        if field is None:
+            continue
+        
+        value = food_nutrient.get('amount', 0)
+        unit = nutrient.get('unitName', '')
+        
+        if field == 'calories':
+            # Energy is also reported in kJ; only kcal rows are calories
+            if unit.lower() == 'kcal':
                 nutrients['calories'] = round(value)
-            elif 'protein' in name:
-                nutrients['protein'] = f"{round(value)}{unit}"
-            elif 'carbohydrate' in name:
-                nutrients['carbs'] = f"{round(value)}{unit}"
-            elif 'total lipid' in name or 'fat, total' in name:
-                nutrients['fat'] = f"{round(value)}{unit}"
-            elif 'fiber' in name:
-                nutrients['fiber'] = f"{round(value)}{unit}"
-            elif 'sugars, total' in name:
-                nutrients['sugar'] = f"{round(value)}{unit}"
-            elif 'sodium' in name:
-                nutrients['sodium'] = f"{round(value)}{unit}"
+        else:
+            nutrients[field] = round(value)
+            units[field] = unit
     
     serving_size = _get_serving_size(usda_data)
     
@@ -328,46 +911,54 @@ def _parse_usda_nutrition(usda_data: Dict[str, Any]) -> Dict[str, Any]:
         'name': usda_data.get('description', usda_data.get('lowercaseDescription', 'Unknown')),
         'serving_size': serving_size,
         'calories': nutrients.get('calories', 0),
-        'protein': nutrients.get('protein', 'N/A'),
-        'carbs': nutrients.get('carbs', 'N/A'),
-        'fat': nutrients.get('fat', 'N/A'),
-        'fiber': nutrients.get('fiber', 'N/A'),
-        'sugar': nutrients.get('sugar', 'N/A'),
-        'sodium': nutrients.get('sodium', 'N/A'),
+        'protein': _fmt_usda(nutrients, units, 'protein'),
+        'carbs': _fmt_usda(nutrients, units, 'carbs'),
+        'fat': _fmt_usda(nutrients, units, 'fat'),
+        'fiber': _fmt_usda(nutrients, units, 'fiber'),
+        'sugar': _fmt_usda(nutrients, units, 'sugar'),
+        'sodium': _fmt_usda(nutrients, units, 'sodium'),
         'health_score': _calculate_health_score(nutrients),
         'source': 'USDA FoodData Central'
     }
 
+# Edamam nutrient codes mapped to our nutrient fields
+_EDAMAM_NUTRIENT_CODES = (
+    ('PROCNT', 'protein'),
+    ('CHOCDF', 'carbs'),
+    ('FAT', 'fat'),
+    ('FIBTG', 'fiber'),
+    ('SUGAR', 'sugar'),
+    ('NA', 'sodium'),
+)
+
 def _parse_edamam_nutrition(edamam_data: Dict[str, Any], product_name: str) -> Dict[str, Any]:
     """Parse Edamam nutrition data into standard format"""
     nutrients = edamam_data.get('totalNutrients', {})
     
+    values = {
+        field: round(nutrients[code].get('quantity', 0)) if code in nutrients else 0
+        for code, field in _EDAMAM_NUTRIENT_CODES
+    }
     calories = round(edamam_data.get('calories', 0))
-    protein = round(nutrients.get('PROCNT', {}).get('quantity', 0)) if 'PROCNT' in nutrients else 0
-    carbs = round(nutrients.get('CHOCDF', {}).get('quantity', 0)) if 'CHOCDF' in nutrients else 0
-    fat = round(nutrients.get('FAT', {}).get('quantity', 0)) if 'FAT' in nutrients else 0
-    fiber = round(nutrients.get('FIBTG', {}).get('quantity', 0)) if 'FIBTG' in nutrients else 0
-    sugar = round(nutrients.get('SUGAR', {}).get('quantity', 0)) if 'SUGAR' in nutrients else 0
-    sodium = round(nutrients.get('NA', {}).get('quantity', 0)) if 'NA' in nutrients else 0
     
     nutrient_dict = {
         'calories': calories,
-        'protein': protein,
-        'fiber': fiber,
-        'sugar': sugar,
-        'sodium': sodium
+        'protein': values['protein'],
+        'fiber': values['fiber'],
+        'sugar': values['sugar'],
+        'sodium': values['sodium']
     }
     
     return {
         'name': product_name,
         'serving_size': '1 serving',
         'calories': calories,
-        'protein': f"{protein}g",
-        'carbs': f"{carbs}g",
-        'fat': f"{fat}g",
-        'fiber': f"{fiber}g",
-        'sugar': f"{sugar}g",
-        'sodium': f"{sodium}mg",
+        'protein': _fmt(values['protein'], 'g'),
+        'carbs': _fmt(values['carbs'], 'g'),
+        'fat': _fmt(values['fat'], 'g'),
+        'fiber': _fmt(values['fiber'], 'g'),
+        'sugar': _fmt(values['sugar'], 'g'),
+        'sodium': _fmt(values['sodium'], 'mg'),
         'health_score': _calculate_health_score(nutrient_dict),
         'source': 'Edamam Nutrition API'
     }
@@ -375,21 +966,20 @@ def _parse_edamam_nutrition(edamam_data: Dict[str, Any], product_name: str) -> D
 def _parse_spoonacular_nutrition(spoon_data: Dict[str, Any]) -> Dict[str, Any]:
     """Parse Spoonacular nutrition data into standard format"""
     nutrition = spoon_data.get('nutrition', {})
-    nutrients = nutrition.get('nutrients', [])
-    
-    def get_nutrient(name):
-        for nutrient in nutrients:
-            if name.lower() in nutrient.get('name', '').lower():
-                return round(nutrient.get('amount', 0))
-        return 0
-    
-    calories = get_nutrient('calories')
-    protein = get_nutrient('protein')
-    carbs = get_nutrient('carbohydrates')
-    fat = get_nutrient('fat')
-    fiber = get_nutrient('fiber')
-    sugar = get_nutrient('sugar')
-    sodium = get_nutrient('sodium')
+    
+    # Lowercase each nutrient name once rather than once per lookup
+    nutrients = [
+        (nutrient.get('name', '').lower(), nutrient.get('amount', 0))
+        for nutrient in nutrition.get('nutrients', [])
+    ]
+    
+    calories = _get_spoonacular_nutrient(nutrients, 'calories')
+    protein = _get_spoonacular_nutrient(nutrients, 'protein')
+    carbs = _get_spoonacular_nutrient(nutrients, 'carbohydrates')
+    fat = _get_spoonacular_nutrient(nutrients, 'fat')
+    fiber = _get_spoonacular_nutrient(nutrients, 'fiber')
+    sugar = _get_spoonacular_nutrient(nutrients, 'sugar')
+    sodium = _get_spoonacular_nutrient(nutrients, 'sodium')
     
     nutrient_dict = {
         'calories': calories,
@@ -406,16 +996,33 @@ def _parse_spoonacular_nutrition(spoon_data: Dict[str, Any]) -> Dict[str, Any]:
         'name': spoon_data.get('title', 'Unknown Product'),
         'serving_size': serving_size,
         'calories': calories,
-        'protein': f"{protein}g",
-        'carbs': f"{carbs}g",
-        'fat': f"{fat}g",
-        'fiber': f"{fiber}g",
-        'sugar': f"{sugar}g",
-        'sodium': f"{sodium}mg",
+        'protein': _fmt(protein, 'g'),
+        'carbs': _fmt(carbs, 'g'),
+        'fat': _fmt(fat, 'g'),
+        'fiber': _fmt(fiber, 'g'),
+        'sugar': _fmt(sugar, 'g'),
+        'sodium': _fmt(sodium, 'mg'),
         'health_score': _calculate_health_score(nutrient_dict),
         'source': 'Spoonacular API'
     }
 
+def _get_spoonacular_nutrient(nutrients: List[Tuple[str, float]], name: str) -> int:
+    """Rounded amount of the first nutrient whose lowercased name contains name, or 0"""
+    for nutrient_name, amount in nutrients:
+        if name in nutrient_name:
+            return round(amount)
+    return 0
+
+def _fmt(value: float, unit: str) -> str:
+    """Format a nutrient amount for the API response, e.g. 4.2 and 'g' -> '4g'"""
+    return f"{round(value)}{unit}"
+
+def _fmt_usda(nutrients: Dict[str, float], units: Dict[str, str], field: str) -> str:
+    """Format a parsed USDA nutrient, or 'N/A' when USDA did not report it"""
+    if field not in nutrients:
+        return 'N/A'
+    return _fmt(nutrients[field], units[field])
+
 def _get_serving_size(usda_data: Dict[str, Any]) -> str:
     """Extract serving size from USDA data"""
     if usda_data.get('servingSize') and usda_data.get('servingSizeUnit'):
@@ -425,99 +1032,82 @@ def _get_serving_size(usda_data: Dict[str, Any]) -> str:
     else:
         return '1 serving'
 
-def _calculate_health_score(nutrients: Dict[str, Any]) -> int:
-    """Calculate health score from 1-10 based on nutritional content"""
-    score = 5  # Start neutral
-    
-    # Positive factors
-    protein_val = _extract_number(nutrients.get('protein', 0))
-    fiber_val = _extract_number(nutrients.get('fiber', 0))
-    calories_val = _extract_number(nutrients.get('calories', 0))
-    
-    if protein_val > 3:
-        score += 1
-    if fiber_val > 2:
-        score += 1
-    if calories_val < 100:
-        score += 1
-    
-    # Negative factors
-    sugar_val = _extract_number(nutrients.get('sugar', 0))
-    sodium_val = _extract_number(nutrients.get('sodium', 0))
-    fat_val = _extract_number(nutrients.get('fat', 0))
-    
-    if sugar_val > 15:
-        score -= 1
-    if sodium_val > 200:
-        score -= 1
-    if calories_val > 200:
-        score -= 1
-    if fat_val > 10:
-        score -= 1
+def _calculate_health_score(nutrients: Dict[str, float]) -> int:
+    """Calculate health score from 1-10 based on numeric nutrient amounts"""
+    calories = nutrients.get('calories', 0)
+    
+    # Start neutral; each comparison adds or subtracts one point
+    score = (
+        5
+        # Positive factors
+        + (nutrients.get('protein', 0) > 3)
+        + (nutrients.get('fiber', 0) > 2)
+        + (calories < 100)
+        # Negative factors
+        - (nutrients.get('sugar', 0) > 15)
+        - (nutrients.get('sodium', 0) > 200)
+        - (calories > 200)
+        - (nutrients.get('fat', 0) > 10)
+    )
     
     return max(1, min(10, score))
 
-def _extract_number(value: Any) -> float:
-    """Extract numeric value from string or return the number"""
-    if isinstance(value, (int, float)):
-        return float(value)
-    elif isinstance(value, str):
-        # Extract first number from string
-        import re
-        match = re.search(r'\d+\.?\d*', value)
-        return float(match.group()) if match else 0
-    else:
-        return 0
+# Comprehensive mock database
+_MOCK_DB = MappingProxyType({k: MappingProxyType(v) for k, v in {
+    # Beverages - Sodas
+    'coca-cola classic': {'name': 'Coca-Cola Classic', 'serving_size': '12 fl oz (355ml)', 'calories': 140, 'protein': '0g', 'carbs': '39g', 'fat': '0g', 'fiber': '0g', 'sugar': '39g', 'sodium': '45mg', 'health_score': 2},
+    'diet coke': {'name': 'Diet Coke', 'serving_size': '12 fl oz (355ml)', 'calories': 0, 'protein': '0g', 'carbs': '0g', 'fat': '0g', 'fiber': '0g', 'sugar': '0g', 'sodium': '40mg', 'health_score': 6},
+    'pepsi cola': {'name': 'Pepsi Cola', 'serving_size': '12 fl oz (355ml)', 'calories': 150, 'protein': '0g', 'carbs': '41g', 'fat': '0g', 'fiber': '0g', 'sugar': '41g', 'sodium': '30mg', 'health_score': 2},
+    'mountain dew': {'name': 'Mountain Dew', 'serving_size': '12 fl oz (355ml)', 'calories': 170, 'protein': '0g', 'carbs': '46g', 'fat': '0g', 'fiber': '0g', 'sugar': '46g', 'sodium': '60mg', 'health_score': 1},
+    'dr pepper': {'name': 'Dr Pepper', 'serving_size': '12 fl oz (355ml)', 'calories': 150, 'protein': '0g', 'carbs': '40g', 'fat': '0g', 'fiber': '0g', 'sugar': '40g', 'sodium': '55mg', 'health_score': 2},
+    'sprite lemon-lime soda': {'name': 'Sprite', 'serving_size': '12 fl oz (355ml)', 'calories': 140, 'protein': '0g', 'carbs': '38g', 'fat': '0g', 'fiber': '0g', 'sugar': '38g', 'sodium': '65mg', 'health_score': 2},
+    
+    # Candy & Chocolate
+    'snickers chocolate bar': {'name': 'Snickers Bar', 'serving_size': '1.86 oz (52.7g)', 'calories': 250, 'protein': '4g', 'carbs': '33g', 'fat': '12g', 'fiber': '1g', 'sugar': '27g', 'sodium': '120mg', 'health_score': 3},
+    'm&ms milk chocolate': {'name': 'M&Ms Milk Chocolate', 'serving_size': '1.69 oz (47.9g)', 'calories': 240, 'protein': '2g', 'carbs': '34g', 'fat': '10g', 'fiber': '1g', 'sugar': '31g', 'sodium': '15mg', 'health_score': 2},
+    'reeses peanut butter cups': {'name': 'Reeses Peanut Butter Cups', 'serving_size': '1.5 oz (42g)', 'calories': 210, 'protein': '5g', 'carbs': '24g', 'fat': '13g', 'fiber': '2g', 'sugar': '21g', 'sodium': '135mg', 'health_score': 3},
+    'kit kat wafer bar': {'name': 'Kit Kat', 'serving_size': '1.5 oz (42g)', 'calories': 210, 'protein': '3g', 'carbs': '27g', 'fat': '11g', 'fiber': '1g', 'sugar': '22g', 'sodium': '16mg', 'health_score': 2},
+    
+    # Chips & Snacks
+    'lays classic potato chips': {'name': 'Lays Classic Chips', 'serving_size': '1 oz (28g)', 'calories': 160, 'protein': '2g', 'carbs': '15g', 'fat': '10g', 'fiber': '1g', 'sugar': '0g', 'sodium': '170mg', 'health_score': 3},
+    'doritos nacho cheese': {'name': 'Doritos Nacho Cheese', 'serving_size': '1 oz (28g)', 'calories': 150, 'protein': '2g', 'carbs': '18g', 'fat': '8g', 'fiber': '1g', 'sugar': '1g', 'sodium': '210mg', 'health_score': 3},
+    'cheetos crunchy': {'name': 'Cheetos Crunchy', 'serving_size': '1 oz (28g)', 'calories': 160, 'protein': '2g', 'carbs': '13g', 'fat': '10g', 'fiber': '1g', 'sugar': '1g', 'sodium': '250mg', 'health_score': 2},
+    
+    # Healthy Options
+    'nature valley granola bar': {'name': 'Nature Valley Granola Bar', 'serving_size': '1 bar (42g)', 'calories': 190, 'protein': '4g', 'carbs': '29g', 'fat': '7g', 'fiber': '3g', 'sugar': '11g', 'sodium': '160mg', 'health_score': 6},
+    'clif energy bar': {'name': 'Clif Bar', 'serving_size': '1 bar (68g)', 'calories': 250, 'protein': '9g', 'carbs': '44g', 'fat': '5g', 'fiber': '5g', 'sugar': '21g', 'sodium': '200mg', 'health_score': 7},
+    'planters roasted peanuts': {'name': 'Planters Peanuts', 'serving_size': '1 oz (28g)', 'calories': 170, 'protein': '7g', 'carbs': '5g', 'fat': '14g', 'fiber': '2g', 'sugar': '1g', 'sodium': '115mg', 'health_score': 7},
+    
+    # Water & Beverages
+    'dasani bottled water': {'name': 'Dasani Water', 'serving_size': '16.9 fl oz (500ml)', 'calories': 0, 'protein': '0g', 'carbs': '0g', 'fat': '0g', 'fiber': '0g', 'sugar': '0g', 'sodium': '0mg', 'health_score': 10},
+    'gatorade sports drink': {'name': 'Gatorade', 'serving_size': '12 fl oz (355ml)', 'calories': 80, 'protein': '0g', 'carbs': '21g', 'fat': '0g', 'fiber': '0g', 'sugar': '21g', 'sodium': '160mg', 'health_score': 5},
+}.items()})
+
+# Earliest mock key position for each mock key word, for partial matching
+_MOCK_KEYS = tuple(_MOCK_DB)
+_MOCK_WORD_POSITIONS = {}
+for _position, _mock_key in reversed(list(enumerate(_MOCK_KEYS))):
+    for _word in _mock_key.split():
+        _MOCK_WORD_POSITIONS[_word] = _position
+del _position, _mock_key, _word
+
+_MOCK_KEY_BLOB = _build_key_blob(_MOCK_KEYS)
+_MOCK_WORD_AUTOMATON = _build_automaton(_MOCK_WORD_POSITIONS)
 
 def _get_enhanced_mock_data(product_name: str) -> Dict[str, Any]:
     """Get enhanced mock nutrition data for common vending machine products"""
     
-    # Comprehensive mock database
-    mock_database = {
-        # Beverages - Sodas
-        'coca-cola classic': {'name': 'Coca-Cola Classic', 'serving_size': '12 fl oz (355ml)', 'calories': 140, 'protein': '0g', 'carbs': '39g', 'fat': '0g', 'fiber': '0g', 'sugar': '39g', 'sodium': '45mg', 'health_score': 2},
-        'diet coke': {'name': 'Diet Coke', 'serving_size': '12 fl oz (355ml)', 'calories': 0, 'protein': '0g', 'carbs': '0g', 'fat': '0g', 'fiber': '0g', 'sugar': '0g', 'sodium': '40mg', 'health_score': 6},
-        'pepsi cola': {'name': 'Pepsi Cola', 'serving_size': '12 fl oz (355ml)', 'calories': 150, 'protein': '0g', 'carbs': '41g', 'fat': '0g', 'fiber': '0g', 'sugar': '41g', 'sodium': '30mg', 'health_score': 2},
-        'mountain dew': {'name': 'Mountain Dew', 'serving_size': '12 fl oz (355ml)', 'calories': 170, 'protein': '0g', 'carbs': '46g', 'fat': '0g', 'fiber': '0g', 'sugar': '46g', 'sodium': '60mg', 'health_score': 1},
-        'dr pepper': {'name': 'Dr Pepper', 'serving_size': '12 fl oz (355ml)', 'calories': 150, 'protein': '0g', 'carbs': '40g', 'fat': '0g', 'fiber': '0g', 'sugar': '40g', 'sodium': '55mg', 'health_score': 2},
-        'sprite lemon-lime soda': {'name': 'Sprite', 'serving_size': '12 fl oz (355ml)', 'calories': 140, 'protein': '0g', 'carbs': '38g', 'fat': '0g', 'fiber': '0g', 'sugar': '38g', 'sodium': '65mg', 'health_score': 2},
-        
-        # Candy & Chocolate
-        'snickers chocolate bar': {'name': 'Snickers Bar', 'serving_size': '1.86 oz (52.7g)', 'calories': 250, 'protein': '4g', 'carbs': '33g', 'fat': '12g', 'fiber': '1g', 'sugar': '27g', 'sodium': '120mg', 'health_score': 3},
-        'm&ms milk chocolate': {'name': 'M&Ms Milk Chocolate', 'serving_size': '1.69 oz (47.9g)', 'calories': 240, 'protein': '2g', 'carbs': '34g', 'fat': '10g', 'fiber': '1g', 'sugar': '31g', 'sodium': '15mg', 'health_score': 2},
-        'reeses peanut butter cups': {'name': 'Reeses Peanut Butter Cups', 'serving_size': '1.5 oz (42g)', 'calories': 210, 'protein': '5g', 'carbs': '24g', 'fat': '13g', 'fiber': '2g', 'sugar': '21g', 'sodium': '135mg', 'health_score': 3},
-        'kit kat wafer bar': {'name': 'Kit Kat', 'serving_size': '1.5 oz (42g)', 'calories': 210, 'protein': '3g', 'carbs': '27g', 'fat': '11g', 'fiber': '1g', 'sugar': '22g', 'sodium': '16mg', 'health_score': 2},
-        
-        # Chips & Snacks
-        'lays classic potato chips': {'name': 'Lays Classic Chips', 'serving_size': '1 oz (28g)', 'calories': 160, 'protein': '2g', 'carbs': '15g', 'fat': '10g', 'fiber': '1g', 'sugar': '0g', 'sodium': '170mg', 'health_score': 3},
-        'doritos nacho cheese': {'name': 'Doritos Nacho Cheese', 'serving_size': '1 oz (28g)', 'calories': 150, 'protein': '2g', 'carbs': '18g', 'fat': '8g', 'fiber': '1g', 'sugar': '1g', 'sodium': '210mg', 'health_score': 3},
-        'cheetos crunchy': {'name': 'Cheetos Crunchy', 'serving_size': '1 oz (28g)', 'calories': 160, 'protein': '2g', 'carbs': '13g', 'fat': '10g', 'fiber': '1g', 'sugar': '1g', 'sodium': '250mg', 'health_score': 2},
-        
-        # Healthy Options
-        'nature valley granola bar': {'name': 'Nature Valley Granola Bar', 'serving_size': '1 bar (42g)', 'calories': 190, 'protein': '4g', 'carbs': '29g', 'fat': '7g', 'fiber': '3g', 'sugar': '11g', 'sodium': '160mg', 'health_score': 6},
-        'clif energy bar': {'name': 'Clif Bar', 'serving_size': '1 bar (68g)', 'calories': 250, 'protein': '9g', 'carbs': '44g', 'fat': '5g', 'fiber': '5g', 'sugar': '21g', 'sodium': '200mg', 'health_score': 7},
-        'planters roasted peanuts': {'name': 'Planters Peanuts', 'serving_size': '1 oz (28g)', 'calories': 170, 'protein': '7g', 'carbs': '5g', 'fat': '14g', 'fiber': '2g', 'sugar': '1g', 'sodium': '115mg', 'health_score': 7},
-        
-        # Water & Beverages
-        'dasani bottled water': {'name': 'Dasani Water', 'serving_size': '16.9 fl oz (500ml)', 'calories': 0, 'protein': '0g', 'carbs': '0g', 'fat': '0g', 'fiber': '0g', 'sugar': '0g', 'sodium': '0mg', 'health_score': 10},
-        'gatorade sports drink': {'name': 'Gatorade', 'serving_size': '12 fl oz (355ml)', 'calories': 80, 'protein': '0g', 'carbs': '21g', 'fat': '0g', 'fiber': '0g', 'sugar': '21g', 'sodium': '160mg', 'health_score': 5},
-    }
-    
     # Normalize product name for lookup
-    key = product_name.lower().replace('-', ' ').replace('_', ' ').strip()
+    key = product_name.lower().translate(_SEPARATOR_TABLE).strip()
     
     # Try exact match
-    if key in mock_database:
-        result = mock_database[key].copy()
-        result['source'] = 'Enhanced Vending Database'
-        return result
+    if key in _MOCK_DB:
+        return {**_MOCK_DB[key], 'source': 'Enhanced Vending Database'}
     
     # Try partial matching
-    for mock_key, mock_data in mock_database.items():
-        if any(word in mock_key for word in key.split()) or any(word in key for word in mock_key.split()):
-            result = mock_data.copy()
-            result['source'] = 'Enhanced Vending Database'
-            return result
+    position = _find_mock_position(key)
+    if position != -1:
+        return {**_MOCK_DB[_MOCK_KEYS[position]], 'source': 'Enhanced Vending Database'}
     
     # Generic fallback
     return {
@@ -532,4 +1122,33 @@ def _get_enhanced_mock_data(product_name: str) -> Dict[str, Any]:
         'sodium': '100mg',
         'health_score': 4,
         'source': 'Estimated Values'
-    }
\ No newline at end of file
+    }
+
+def _find_mock_position(key: str) -> int:
+    """
+    Find the first mock key sharing a word with the normalized product name
+    
+    Args:
+        key: Normalized product name
+        
+    Returns:
+        Position of the earliest matching key in _MOCK_KEYS, or -1
+    """
+    best = len(_MOCK_KEYS)
+    
+    # A word of the name inside a mock key
+    for word in key.split():
+        position = _first_key_containing(word, _MOCK_KEY_BLOB)
+        if position != -1:
+            best = min(best, position)
+    
+    # A word of a mock key inside the name
+    if _MOCK_WORD_AUTOMATON is not None:
+        for _, position in _MOCK_WORD_AUTOMATON.iter(key):
+            best = min(best, position)
+    else:
+        for word, position in _MOCK_WORD_POSITIONS.items():
+            if position < best and word in key:
+                best = position
+    
+    return best if best < len(_MOCK_KEYS) else -1
\ No newline at end of file
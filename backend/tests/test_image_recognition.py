@@ -0,0 +1,43 @@
+"""
+Tests for the Google Vision result cache in the image recognition service
+"""
+
+import logging
+
+import pytest
+
+from services import image_recognition
+
+
+@pytest.fixture(autouse=True)
+def fresh_vision_cache(monkeypatch):
+    """Start each test without a Vision cache and with a fake Vision call"""
+    monkeypatch.setattr(image_recognition, '_VISION_CACHE', None)
+    monkeypatch.setattr(image_recognition, '_VISION_CACHE_DISABLED', False)
+    calls = []
+    monkeypatch.setattr(image_recognition, '_detect_text_with_google_vision',
+                        lambda image_bytes: calls.append(image_bytes) or 'SNICKERS')
+    return calls
+
+
+@pytest.mark.skipif(not image_recognition.DISKCACHE_AVAILABLE, reason="diskcache not installed")
+def test_repeated_image_uses_cached_text(monkeypatch, tmp_path, fresh_vision_cache):
+    monkeypatch.setenv('VISION_CACHE_DIR', str(tmp_path / 'vision'))
+    
+    image_recognition._analyze_with_google_vision(b'image', 'a.jpg')
+    image_recognition._analyze_with_google_vision(b'image', 'a.jpg')
+    
+    assert len(fresh_vision_cache) == 1
+
+
+@pytest.mark.skipif(not image_recognition.DISKCACHE_AVAILABLE, reason="diskcache not installed")
+def test_unusable_cache_dir_still_calls_vision(monkeypatch, caplog, fresh_vision_cache):
+    monkeypatch.setenv('VISION_CACHE_DIR', '/proc/snackscan/vision')
+    
+    with caplog.at_level(logging.WARNING, logger='services.image_recognition'):
+        image_recognition._analyze_with_google_vision(b'image', 'a.jpg')
+        image_recognition._analyze_with_google_vision(b'image', 'a.jpg')
+    
+    assert len(fresh_vision_cache) == 2
+    assert len([r for r in caplog.records if 'cache disabled' in r.getMessage()]) == 1
+    assert not [r for r in caplog.records if 'Google Vision API error' in r.getMessage()]
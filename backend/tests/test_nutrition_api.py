@@ -0,0 +1,150 @@
+"""
+Tests for the nutrition API service's circuit breakers and lookup deadline,
+run against a fake HTTP session instead of the real APIs
+"""
+
+import json
+import time
+
+import pytest
+import requests
+
+from services import nutrition_api
+
+
+class FakeResponse:
+    """Minimal stand-in for requests.Response"""
+    
+    def __init__(self, status_code, data=None):
+        self.status_code = status_code
+        self.content = json.dumps(data if data is not None else {}).encode()
+    
+    def json(self):
+        return json.loads(self.content)
+    
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} error")
+
+
+class FakeSession:
+    """Session whose GET/POST answers come from a handler(method, url, params)"""
+    
+    def __init__(self, handler, delay=0.0):
+        self.handler = handler
+        self.delay = delay
+        self.calls = []
+    
+    def _request(self, method, url, params=None, **kwargs):
+        self.calls.append((method, url))
+        if self.delay:
+            time.sleep(self.delay)
+        return self.handler(method, url, params or {})
+    
+    def get(self, url, params=None, **kwargs):
+        return self._request('GET', url, params)
+    
+    def post(self, url, params=None, **kwargs):
+        return self._request('POST', url, params)
+
+
+@pytest.fixture(autouse=True)
+def clean_state(monkeypatch):
+    """Reset caches and breakers, and configure only the USDA API"""
+    for breaker in nutrition_api._BREAKERS.values():
+        breaker['fails'] = 0
+        breaker['open_until'] = 0.0
+    nutrition_api._NUTRITION_CACHE.clear()
+    nutrition_api._FALLBACK_CACHE.clear()
+    
+    monkeypatch.setenv('USDA_API_KEY', 'test-key')
+    for name in ('EDAMAM_APP_ID', 'EDAMAM_APP_KEY', 'SPOONACULAR_API_KEY', 'REDIS_HOST'):
+        monkeypatch.delenv(name, raising=False)
+    yield
+
+
+def use_session(monkeypatch, handler, delay=0.0):
+    session = FakeSession(handler, delay)
+    monkeypatch.setattr(nutrition_api, '_SESSION', session)
+    return session
+
+
+def fetch_usda():
+    return nutrition_api._fetch_usda_nutrition('snickers', 'test-key', time.monotonic() + 3)
+
+
+@pytest.mark.parametrize('status', [401, 402, 403, 429])
+def test_breaker_opens_after_repeated_refusals(monkeypatch, status):
+    session = use_session(monkeypatch, lambda method, url, params: FakeResponse(status))
+    
+    for _ in range(nutrition_api.CIRCUIT_BREAKER_THRESHOLD):
+        assert fetch_usda() is None
+    assert len(session.calls) == nutrition_api.CIRCUIT_BREAKER_THRESHOLD
+    
+    # Open breaker: no further requests until the cooldown passes
+    assert fetch_usda() is None
+    assert len(session.calls) == nutrition_api.CIRCUIT_BREAKER_THRESHOLD
+
+
+def test_breaker_ignores_no_data_responses(monkeypatch):
+    session = use_session(monkeypatch, lambda method, url, params: FakeResponse(404))
+    
+    for _ in range(nutrition_api.CIRCUIT_BREAKER_THRESHOLD + 1):
+        assert fetch_usda() is None
+    assert len(session.calls) == nutrition_api.CIRCUIT_BREAKER_THRESHOLD + 1
+
+
+def test_breaker_resets_after_a_success(monkeypatch):
+    statuses = [503] * (nutrition_api.CIRCUIT_BREAKER_THRESHOLD - 1) + [200, 503]
+    session = use_session(monkeypatch, lambda method, url, params: FakeResponse(statuses.pop(0), {'foods': []}))
+    
+    for _ in range(len(statuses)):
+        fetch_usda()
+    
+    # Failures before the success no longer count, so the breaker stays closed
+    assert fetch_usda() is None
+    assert len(session.calls) == nutrition_api.CIRCUIT_BREAKER_THRESHOLD + 2
+
+
+def test_breaker_retries_after_cooldown(monkeypatch):
+    session = use_session(monkeypatch, lambda method, url, params: FakeResponse(429))
+    for _ in range(nutrition_api.CIRCUIT_BREAKER_THRESHOLD):
+        fetch_usda()
+    
+    nutrition_api._BREAKERS['USDA API']['open_until'] = time.monotonic() - 1
+    fetch_usda()
+    assert len(session.calls) == nutrition_api.CIRCUIT_BREAKER_THRESHOLD + 1
+
+
+def test_slow_apis_fall_back_to_mock_data_at_the_deadline(monkeypatch):
+    monkeypatch.setattr(nutrition_api, 'NUTRITION_LOOKUP_BUDGET', 0.3)
+    use_session(monkeypatch, lambda method, url, params: FakeResponse(200, {'foods': []}), delay=1.0)
+    
+    start = time.monotonic()
+    result = nutrition_api.get_nutrition_data('Snickers Chocolate Bar')
+    elapsed = time.monotonic() - start
+    
+    assert result['source'] == 'Enhanced Vending Database'
+    assert result['name'] == 'Snickers Bar'
+    assert elapsed < 0.9
+
+
+def test_usda_hit_on_first_term_sends_no_other_requests(monkeypatch):
+    def handler(method, url, params):
+        if method == 'POST':
+            return FakeResponse(200, [{
+                'fdcId': 1,
+                'description': 'SNICKERS BAR',
+                'foodNutrients': [{'nutrient': {'name': 'Energy', 'unitName': 'kcal'}, 'amount': 250}]
+            }])
+        return FakeResponse(200, {'foods': [{'fdcId': 1, 'description': 'SNICKERS BAR', 'dataType': 'Branded'}]})
+    
+    session = use_session(monkeypatch, handler)
+    monkeypatch.setenv('EDAMAM_APP_ID', 'id')
+    monkeypatch.setenv('EDAMAM_APP_KEY', 'key')
+    
+    result = nutrition_api.get_nutrition_data('Snickers Chocolate Bar')
+    
+    assert result['source'] == 'USDA FoodData Central'
+    assert result['calories'] == 250
+    assert len(session.calls) == 2
@@ -3,6 +3,26 @@
 
 const API_BASE_URL = process.env.REACT_APP_API_URL || 'http://127.0.0.1:5000';
 
+// Random id for this browser tab's scanning session, sent with every lookup so
+// the backend can learn which products tend to be scanned together
+const SCAN_SESSION_KEY = 'snackscan-scan-session';
+
+const getScanSessionId = () => {
+  try {
+    let sessionId = sessionStorage.getItem(SCAN_SESSION_KEY);
+    if (!sessionId) {
+      sessionId = window.crypto && window.crypto.randomUUID
+        ? window.crypto.randomUUID()
+        : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+      sessionStorage.setItem(SCAN_SESSION_KEY, sessionId);
+    }
+    return sessionId;
+  } catch (error) {
+    // Storage can be unavailable (e.g. private browsing); skip the session id
+    return null;
+  }
+};
+
 export const getNutritionData = async (productName) => {
   try {
     console.log(`🔍 Getting nutrition data from Python backend for: ${productName}`);
@@ -11,10 +31,12 @@ export const getNutritionData = async (productName) => {
     const encodedProductName = encodeURIComponent(productName);
     
     // Call Python backend API
+    const scanSessionId = getScanSessionId();
     const response = await fetch(`${API_BASE_URL}/api/nutrition/${encodedProductName}`, {
       method: 'GET',
       headers: {
         'Content-Type': 'application/json',
+        ...(scanSessionId && { 'X-Scan-Session': scanSessionId }),
       },
     });
     